@@ -1,5 +1,161 @@
+from itertools import islice
 from pathlib import Path
+import argparse
 import json
+import os
+import sqlite3
+import time
+
+COMPACT_AT = 1 << 20
+PAGE_SIZE = 20
+
+
+class TaskList:
+    # A dict keeps insertion order, so it doubles as the ordered list and as the index:
+    # membership, add and remove are O(1) and iterating still shows tasks in the order added.
+    def __init__(self, tasks=()):
+        self._tasks = dict.fromkeys(tasks)
+
+    def __contains__(self, task):
+        return task in self._tasks
+
+    def __iter__(self):
+        return iter(self._tasks)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def add(self, task):
+        if task in self._tasks:
+            return False
+        self._tasks[task] = None
+        return True
+
+    def remove(self, task):
+        if task not in self._tasks:
+            return False
+        del self._tasks[task]
+        return True
+
+
+class JournalStore:
+    # Task.json is the snapshot, every add/remove is appended to Task.journal as one line.
+    # Replaying is idempotent (adding a present task or removing a missing one does nothing),
+    # so a crash between writing a new snapshot and emptying the journal is harmless.
+    def __init__(self, snapshot=Path("Task.json"), journal=Path("Task.journal"), compact_at=COMPACT_AT):
+        self.snapshot = snapshot
+        self.journal = journal
+        self.compact_at = compact_at
+        self.tasks = TaskList()
+        if snapshot.exists():
+            with open(snapshot, "r", encoding="utf-8") as f:
+                self.tasks = TaskList(json.load(f))
+        good = 0
+        if journal.exists():
+            with open(journal, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line) if line.endswith(b"\n") else None
+                    except json.JSONDecodeError:
+                        record = None
+                    if record is None:
+                        break  # a torn last line from a crash mid-write
+                    self._apply(record["op"], record["task"])
+                    good += len(line)
+        self.file = open(journal, "a", encoding="utf-8")
+        if self.file.tell() > good:
+            # Cut the torn tail off, or the next record would be glued onto it and lost on replay
+            self.file.truncate(good)
+            self.file.seek(good)
+        if self.file.tell() > compact_at:
+            self.compact()
+
+    def __contains__(self, task):
+        return task in self.tasks
+
+    def __iter__(self):
+        return iter(self.tasks)
+
+    def _apply(self, op, task):
+        if op == "add":
+            return self.tasks.add(task)
+        if op == "remove":
+            return self.tasks.remove(task)
+        return False
+
+    def _write(self, op, task):
+        self.file.write(json.dumps({"op": op, "task": task}, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        if self.file.tell() > self.compact_at:
+            self.compact()
+
+    def add(self, task):
+        if not self._apply("add", task):
+            return False
+        self._write("add", task)
+        return True
+
+    def remove(self, task):
+        if not self._apply("remove", task):
+            return False
+        self._write("remove", task)
+        return True
+
+    def compact(self):
+        temporary = self.snapshot.with_name(self.snapshot.name + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(list(self.tasks), f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.snapshot)
+        self.file.close()
+        self.file = open(self.journal, "w", encoding="utf-8")
+
+
+class SqliteStore:
+    # Tasks stay on disk, so startup does not depend on how many there are.
+    # Rows keep insertion order through the autoincrement id, the unique index backs "already there".
+    def __init__(self, path=Path("Task.db")):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, task TEXT NOT NULL)")
+        self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS tasks_task ON tasks (task)")
+        self.db.commit()
+
+    def __contains__(self, task):
+        return self.db.execute("SELECT 1 FROM tasks WHERE task = ?", (task,)).fetchone() is not None
+
+    def __iter__(self):
+        after = 0
+        while rows := self.page(after):
+            yield from (task for _, task in rows)
+            after = rows[-1][0]
+
+    def page(self, after=0, size=PAGE_SIZE):
+        # Keyset pagination: seeking past the last id seen costs the same on every page
+        return self.db.execute("SELECT id, task FROM tasks WHERE id > ? ORDER BY id LIMIT ?", (after, size)).fetchall()
+
+    def add(self, task):
+        with self.db:
+            return self.db.execute("INSERT OR IGNORE INTO tasks (task) VALUES (?)", (task,)).rowcount == 1
+
+    def remove(self, task):
+        with self.db:
+            return self.db.execute("DELETE FROM tasks WHERE task = ?", (task,)).rowcount == 1
+
+    def import_json(self, store):
+        with self.db:
+            before = self.db.total_changes
+            self.db.executemany("INSERT OR IGNORE INTO tasks (task) VALUES (?)", ((task,) for task in store))
+            return self.db.total_changes - before
+
+    def export_json(self, snapshot=Path("Task.json")):
+        temporary = snapshot.with_name(snapshot.name + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(list(self), f, ensure_ascii=False, indent=4)
+        os.replace(temporary, snapshot)
+
 
 def todo():
     global todolist
@@ -11,24 +167,21 @@ def todo():
         choice = input("What to do?: ")
         if choice == "1":
             number = 1
-            for i in todolist:
-                print(f"{number}. {i}\n")
-                number += 1
+            tasks = iter(todolist)
+            while page := list(islice(tasks, PAGE_SIZE)):
+                for i in page:
+                    print(f"{number}. {i}\n")
+                    number += 1
+                if len(page) < PAGE_SIZE or input("Enter for more, anything else to stop: "):
+                    break
         elif choice == "2":
             task = input("What to add: ")
-            if task not in todolist:
-                todolist.append(task)
-            else:
+            if not todolist.add(task):
                 print("already there")
-            with open(Path("Task.json"), "w", encoding="utf-8") as f:
-                json.dump(todolist, f, ensure_ascii=False, indent=4)
             print(f"{task} added")
         elif choice == "3":
             task = input("What to remove: ")
-            if task in todolist:
-                todolist.pop(todolist.index(task))
-                with open(Path("Task.json"), "w", encoding="utf-8") as f:
-                    json.dump(todolist, f, ensure_ascii=False, indent=4)
+            if todolist.remove(task):
                 print(f"{task} removed")
             else:
                 print("already not there")
@@ -37,7 +190,49 @@ def todo():
         else:
             print("type smth normal")
 
-with open(Path("Task.json"), "r", encoding="utf-8") as f:
-    todolist = json.load(f)
 
-todo()
+def benchmark(sizes=(10**5, 10**6), operations=200):
+    # The old list needs a linear scan for `in`, index() and pop(), TaskList does not
+    for size in sizes:
+        tasks = [f"task {i}" for i in range(size)]
+        probes = [f"task {i}" for i in range(size - operations, size)]
+        results = {}
+        contenders = (
+            ("list", list(tasks), lambda tasks, task: tasks.pop(tasks.index(task)), list.append),
+            ("TaskList", TaskList(tasks), TaskList.remove, TaskList.add),
+        )
+        for name, collection, remove, add in contenders:
+            start = time.perf_counter()
+            for task in probes:
+                if task in collection:
+                    remove(collection, task)
+                if task not in collection:
+                    add(collection, task)
+            results[name] = (time.perf_counter() - start) / operations
+        speedup = results["list"] / results["TaskList"]
+        print(f"{size} tasks: list {results['list'] * 1e6:.1f} us/op, TaskList {results['TaskList'] * 1e6:.2f} us/op, {speedup:.0f}x faster")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simple to-do list.")
+    parser.add_argument("--sqlite", nargs="?", const="Task.db", metavar="PATH", help="keep tasks in a SQLite database")
+    parser.add_argument("--import-json", action="store_true", help="copy Task.json (and its journal) into the SQLite database")
+    parser.add_argument("--export-json", action="store_true", help="write the SQLite tasks back to Task.json")
+    parser.add_argument("--benchmark", action="store_true", help="compare the old list with TaskList and exit")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark()
+    elif args.sqlite:
+        todolist = SqliteStore(Path(args.sqlite))
+        if args.import_json:
+            print(f"{todolist.import_json(JournalStore())} tasks imported")
+        elif args.export_json:
+            todolist.export_json()
+            print("Task.json written")
+        else:
+            todo()
+    elif args.import_json or args.export_json:
+        parser.error("--import-json and --export-json need --sqlite")
+    else:
+        todolist = JournalStore()
+        todo()
@@ -1,42 +1,177 @@
-def unit_converter():
-    def length_conversion(value, from_unit, to_unit):
-        length_units = {
-            "meters": 1,
-            "kilometers": 0.001,
-            "miles": 0.000621371,
-            "inches": 39.3701,
-            "feet": 3.28084
-        }
-        return value / length_units[from_unit] * length_units[to_unit]
-
-    def weight_conversion(value, from_unit, to_unit):
-        weight_units = {
-            "kilograms": 1,
-            "grams": 1000,
-            "pounds": 2.20462,
-            "ounces": 35.274
-        }
-        return value / weight_units[from_unit] * weight_units[to_unit]
-
-    def temperature_conversion(value, from_unit, to_unit):
-        if from_unit == to_unit:
-            return value
-        if from_unit == "celsius":
-            return value * 9/5 + 32 if to_unit == "fahrenheit" else value + 273.15
-        if from_unit == "fahrenheit":
-            return (value - 32) * 5/9 if to_unit == "celsius" else (value - 32) * 5/9 + 273.15
-        if from_unit == "kelvin":
-            return value - 273.15 if to_unit == "celsius" else (value - 273.15) * 9/5 + 32
-
-    def volume_conversion(value, from_unit, to_unit):
-        volume_units = {
-            "liters": 1,
-            "milliliters": 1000,
-            "gallons": 0.264172,
-            "cups": 4.22675
-        }
-        return value / volume_units[from_unit] * volume_units[to_unit]
+import argparse
+import csv
+import io
+import re
+import sys
+import time
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BATCH = 1 << 20
+
+SUPERSCRIPTS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁻", "0123456789-")
+OPERATOR = re.compile(r"\s*(/|·|(?<!\*)\*(?!\*))\s*")
+TERM = re.compile(r"(°?[^\W\d⁰¹²³⁴⁵⁶⁷⁸⁹]+)\s*(?:(?:\^|\*\*)\s*(-?\d+)|([⁰¹²³⁴⁵⁶⁷⁸⁹⁻]+))?")
+
+
+class UnitRegistry:
+    # Units form a graph: each one is defined as an amount of another unit expression,
+    # down to base units that name a dimension. Everything resolves to (factor, offset,
+    # dimension) relative to the base units, and every (from, to) pair collapses into one
+    # cached multiply-add, so a hot loop pays a dict lookup and value * scale + offset.
+    def __init__(self):
+        self.definitions = {}
+        self.aliases = {}
+        self._parsed = {}
+        self._pairs = {}
+
+    def base(self, name, dimension, aliases=()):
+        self.definitions[name] = (1.0, None, 0.0, ((dimension, 1),))
+        self._alias(name, aliases)
+
+    def define(self, name, amount, reference, offset=0.0, aliases=()):
+        self.definitions[name] = (amount, reference, offset, None)
+        self._alias(name, aliases)
+
+    def _alias(self, name, aliases):
+        for alias in (name,) + tuple(aliases):
+            self.aliases[alias] = name
+
+    def _unit(self, name):
+        if name not in self.aliases:
+            raise ValueError(f"unknown unit {name!r}")
+        amount, reference, offset, dimension = self.definitions[self.aliases[name]]
+        if reference is None:
+            return amount, offset, dimension
+        factor, reference_offset, dimension = self.parse(reference)
+        if reference_offset:
+            raise ValueError(f"{name} cannot be defined from an offset unit")
+        return amount * factor, offset * factor, dimension
+
+    def parse(self, expression):
+        # "km/h", "kg·m²" or "m/s^2" -> (factor, offset, dimension)
+        if expression in self._parsed:
+            return self._parsed[expression]
+        parts = OPERATOR.split(expression.strip())
+        factor, offset, exponents = 1.0, 0.0, {}
+        for position in range(0, len(parts), 2):
+            match = TERM.fullmatch(parts[position])
+            if not match:
+                raise ValueError(f"cannot read unit {parts[position]!r} in {expression!r}")
+            name, power, superscript = match.groups()
+            power = int(power or (superscript or "1").translate(SUPERSCRIPTS))
+            if position and parts[position - 1] == "/":
+                power = -power
+            unit_factor, unit_offset, dimension = self._unit(name)
+            if unit_offset:
+                if len(parts) > 1 or power != 1:
+                    raise ValueError(f"{name} has an offset and cannot be part of a compound unit")
+                offset = unit_offset
+            factor *= unit_factor ** power
+            for base, exponent in dimension:
+                exponents[base] = exponents.get(base, 0) + exponent * power
+        dimension = tuple(sorted((base, exponent) for base, exponent in exponents.items() if exponent))
+        self._parsed[expression] = factor, offset, dimension
+        return self._parsed[expression]
+
+    def converter(self, from_unit, to_unit):
+        key = (from_unit, to_unit)
+        if key not in self._pairs:
+            from_factor, from_offset, from_dimension = self.parse(from_unit)
+            to_factor, to_offset, to_dimension = self.parse(to_unit)
+            if from_dimension != to_dimension:
+                raise ValueError(f"cannot convert {from_unit} to {to_unit}")
+            # base = value * from_factor + from_offset, result = (base - to_offset) / to_factor
+            self._pairs[key] = from_factor / to_factor, (from_offset - to_offset) / to_factor
+        return self._pairs[key]
+
+    def convert(self, value, from_unit, to_unit, like=None):
+        # like="m" (or any unit of the wanted kind) rejects units of another dimension
+        if like is not None and self.parse(from_unit)[2] != self.parse(like)[2]:
+            raise ValueError(f"{from_unit} is not measured like {like}")
+        scale, offset = self.converter(from_unit, to_unit)
+        value = as_values(value)
+        if isinstance(value, (list, tuple)):
+            return [v * scale + offset for v in value]
+        return value * scale + offset
+
+
+def as_values(value):
+    # Lists and tuples become arrays so one expression converts every element at once
+    if np is not None and isinstance(value, (list, tuple)):
+        return np.asarray(value, dtype=float)
+    return value
+
+
+units = UnitRegistry()
+units.base("meters", "length", aliases=("m", "meter"))
+units.define("kilometers", 1 / 0.001, "meters", aliases=("km", "kilometer"))
+units.define("miles", 1 / 0.000621371, "meters", aliases=("mi", "mile"))
+units.define("inches", 1 / 39.3701, "meters", aliases=("in", "inch"))
+units.define("feet", 1 / 3.28084, "meters", aliases=("ft", "foot"))
+units.base("kilograms", "mass", aliases=("kg", "kilogram"))
+units.define("grams", 1 / 1000, "kilograms", aliases=("g", "gram"))
+units.define("pounds", 1 / 2.20462, "kilograms", aliases=("lb", "pound"))
+units.define("ounces", 1 / 35.274, "kilograms", aliases=("oz", "ounce"))
+units.base("seconds", "time", aliases=("s", "sec", "second"))
+units.define("minutes", 60, "seconds", aliases=("min", "minute"))
+units.define("hours", 60, "minutes", aliases=("h", "hour"))
+units.define("liters", 0.001, "m^3", aliases=("l", "L", "liter"))
+units.define("milliliters", 1 / 1000, "liters", aliases=("ml", "mL", "milliliter"))
+units.define("gallons", 1 / 0.264172, "liters", aliases=("gal", "gallon"))
+units.define("cups", 1 / 4.22675, "liters", aliases=("cup",))
+units.base("kelvin", "temperature", aliases=("K",))
+units.define("celsius", 1, "kelvin", offset=273.15, aliases=("C", "°C"))
+units.define("fahrenheit", 5 / 9, "kelvin", offset=273.15 - 32 * 5 / 9, aliases=("F", "°F"))
+units.define("newtons", 1, "kg*m/s^2", aliases=("N", "newton"))
+units.define("joules", 1, "N*m", aliases=("J", "joule"))
+
+
+def length_conversion(value, from_unit, to_unit):
+    return units.convert(value, from_unit, to_unit, like="meters")
+
+
+def weight_conversion(value, from_unit, to_unit):
+    return units.convert(value, from_unit, to_unit, like="kilograms")
+
+
+def volume_conversion(value, from_unit, to_unit):
+    return units.convert(value, from_unit, to_unit, like="liters")
+
 
+def temperature_conversion(value, from_unit, to_unit):
+    return units.convert(value, from_unit, to_unit, like="kelvin")
+
+
+CATEGORIES = {
+    "length": (length_conversion, ["meters", "kilometers", "miles", "inches", "feet"]),
+    "weight": (weight_conversion, ["kilograms", "grams", "pounds", "ounces"]),
+    "temperature": (temperature_conversion, ["celsius", "fahrenheit", "kelvin"]),
+    "volume": (volume_conversion, ["liters", "milliliters", "gallons", "cups"]),
+    "units": (units.convert, None),
+}
+
+MENU = {
+    "1": ("Length", "length"),
+    "2": ("Weight", "weight"),
+    "3": ("Temperature", "temperature"),
+    "4": ("Volume", "volume"),
+    "6": ("Compound unit", "units"),
+}
+
+
+def convert(category, value, from_unit, to_unit):
+    func, names = CATEGORIES[category]
+    if names is not None and (from_unit not in names or to_unit not in names):
+        raise ValueError(f"{category} units are {', '.join(names)}")
+    return func(value, from_unit, to_unit)
+
+
+def unit_converter():
     # User interface
     while True:
         print("\nUnit Converter")
@@ -45,33 +180,135 @@ def unit_converter():
         print("3. Temperature")
         print("4. Volume")
         print("5. Exit")
-        choice = input("Choose a category (1-5): ")
+        print("6. Compound units (e.g. km/h to m/s)")
+        choice = input("Choose a category (1-6): ")
 
         if choice == "5":
             print("Exiting the Unit Converter. Goodbye!")
             break
 
-        converters = {
-            "1": ("Length", length_conversion, ["meters", "kilometers", "miles", "inches", "feet"]),
-            "2": ("Weight", weight_conversion, ["kilograms", "grams", "pounds", "ounces"]),
-            "3": ("Temperature", temperature_conversion, ["celsius", "fahrenheit", "kelvin"]),
-            "4": ("Volume", volume_conversion, ["liters", "milliliters", "gallons", "cups"])
-        }
-
-        if choice in converters:
-            category, func, units = converters[choice]
+        if choice in MENU:
+            category, key = MENU[choice]
+            names = CATEGORIES[key][1]
             print(f"\n{category} Conversion")
-            print(f"Available units: {', '.join(units)}")
-            from_unit = input("Convert from: ").lower()
-            to_unit = input("Convert to: ").lower()
+            if names:
+                print(f"Available units: {', '.join(names)}")
+                from_unit = input("Convert from: ").lower()
+                to_unit = input("Convert to: ").lower()
+            else:
+                from_unit = input("Convert from: ").strip()
+                to_unit = input("Convert to: ").strip()
             value = float(input(f"Enter the value in {from_unit}: "))
 
-            if from_unit in units and to_unit in units:
-                result = func(value, from_unit, to_unit)
+            try:
+                result = convert(key, value, from_unit, to_unit)
                 print(f"{value} {from_unit} is equal to {result:.4f} {to_unit}.")
-            else:
+            except ValueError:
                 print("Invalid unit entered. Please try again.")
         else:
             print("Invalid choice. Please select a valid category.")
 
-unit_converter()
+
+def convert_stream(category, from_unit, to_unit, source, out):
+    # Numbers separated by whitespace, read as bytes a batch at a time so memory stays bounded;
+    # a number cut off at the end of a batch is carried over to the next one
+    tail = b""
+    while chunk := source.read(BATCH):
+        chunk = tail + chunk
+        tail = b""
+        if not chunk[-1:].isspace():
+            *body, tail = chunk.rsplit(None, 1)
+            chunk = body[0] if body else b""
+        write_values(out, parse_numbers(chunk), category, from_unit, to_unit)
+    write_values(out, parse_numbers(tail), category, from_unit, to_unit)
+
+
+def parse_numbers(chunk):
+    if np is None:
+        return [float(token) for token in chunk.split()]
+    return np.fromstring(chunk, sep=" ")
+
+
+def write_values(out, values, category, from_unit, to_unit):
+    if len(values):
+        result = convert(category, values, from_unit, to_unit)
+        out.write("\n".join(map(repr, result if np is None else result.tolist())) + "\n")
+
+
+def convert_csv(category, from_unit, to_unit, source, out, column):
+    reader = csv.reader(source)
+    writer = csv.writer(out)
+    header = next(reader)
+    index = header.index(column) if column in header else int(column)
+    writer.writerow(header + [f"{header[index]}_{to_unit}"])
+    if np is not None:
+        # Unquoted lines are parsed by NumPy a batch at a time and the converted value appended as is;
+        # from the first quote on the csv module takes over, since a quoted field may span lines
+        while lines := source.readlines(BATCH):
+            if any('"' in line for line in lines):
+                reader = csv.reader(chain(lines, source))
+                break
+            lines = [line.rstrip("\r\n") for line in lines if not line.isspace()]
+            values = np.loadtxt(lines, delimiter=",", usecols=index, comments=None, ndmin=1)
+            result = convert(category, values, from_unit, to_unit).tolist()
+            out.write("".join(f"{line},{value!r}\r\n" for line, value in zip(lines, result)))
+    while rows := [row for _, row in zip(range(BATCH), reader)]:
+        values = [float(row[index]) for row in rows]
+        result = convert(category, values, from_unit, to_unit)
+        writer.writerows(row + [value] for row, value in zip(rows, result if np is None else result.tolist()))
+
+
+def benchmark(size=10_000_000, lines=1_000_000):
+    if np is None:
+        print("The benchmark needs NumPy: pip install numpy")
+        return
+    readings = np.random.default_rng(0).uniform(-50, 50, size)
+    for category, from_unit, to_unit in (("length", "miles", "meters"), ("temperature", "celsius", "fahrenheit")):
+        start = time.perf_counter()
+        convert(category, readings, from_unit, to_unit)
+        elapsed = time.perf_counter() - start
+        print(f"{size} {from_unit} -> {to_unit} in memory: {elapsed * 1000:.1f} ms")
+    # The command line paths, parsing and formatting included
+    numbers = "\n".join(map(repr, readings[:lines].tolist())) + "\n"
+    start = time.perf_counter()
+    convert_stream("length", "miles", "meters", io.BytesIO(numbers.encode()), io.StringIO())
+    elapsed = time.perf_counter() - start
+    print(f"{lines} numbers miles -> meters from stdin: {elapsed * 1000:.1f} ms")
+    rows = "reading,miles\r\n" + "".join(f"{i},{line}\r\n" for i, line in enumerate(numbers.splitlines()))
+    start = time.perf_counter()
+    convert_csv("length", "miles", "meters", io.StringIO(rows), io.StringIO(), "miles")
+    elapsed = time.perf_counter() - start
+    print(f"{lines} CSV rows miles -> meters: {elapsed * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert many readings at once.")
+    parser.add_argument("category", nargs="?", choices=list(CATEGORIES))
+    parser.add_argument("from_unit", nargs="?")
+    parser.add_argument("to_unit", nargs="?")
+    parser.add_argument("--csv", metavar="FILE", help="convert a CSV column instead of numbers on stdin, - for stdin")
+    parser.add_argument("--column", default="0", help="CSV column name or index to convert")
+    parser.add_argument("--benchmark", action="store_true", help="time converting 10 million readings in memory and 1 million through stdin and CSV")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark()
+        return
+    if not args.to_unit:
+        parser.error("give a category, a from unit and a to unit")
+    try:
+        convert(args.category, 0.0, args.from_unit, args.to_unit)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.csv:
+        source = sys.stdin if args.csv == "-" else open(args.csv, newline="", encoding="utf-8")
+        with source:
+            convert_csv(args.category, args.from_unit, args.to_unit, source, sys.stdout, args.column)
+    else:
+        convert_stream(args.category, args.from_unit, args.to_unit, sys.stdin.buffer, sys.stdout)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main()
+    else:
+        unit_converter()
@@ -1,12 +1,464 @@
+from array import array
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from operator import itemgetter
+import argparse
+import glob
+import heapq
+import math
+import mmap
+import os
+import re
+import struct
+import sys
 
-def word_counter(text, word):
-    with open(Path(f"{text}.txt"), "r") as file:
-        content = file.read().upper()
-    print(content)
-    print(content.count(word.upper()))
+CHUNK_SIZE = 1 << 20
+SPLIT_SIZE = 64 << 20
+TOKEN = re.compile(r"\w+")
+INDEX_MAGIC = b"WCIDX001"
+# magic, source size, source mtime_ns, number of terms, terms offset, postings offset
+INDEX_HEADER = struct.Struct("<8sQqQQQ")
+# term offset, term length, count, postings offset, postings length
+INDEX_ENTRY = struct.Struct("<QIIQI")
 
-text = input("What text file: ")
-word = input("What word: ")
-print(Path(f"{text}.txt"))
-word_counter(text, word)
+
+def resolve_path(text):
+    path = Path(text)
+    if not path.exists() and Path(f"{text}.txt").exists():
+        path = Path(f"{text}.txt")
+    return path
+
+
+def count_stream(path, word, chunk_size=CHUNK_SIZE):
+    # Only one chunk (plus a tail shorter than the word) is in memory at a time
+    word = word.upper()
+    if not word:
+        return 0
+    count = 0
+    carry = ""
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            buffer = carry + chunk.upper()
+            position = buffer.find(word)
+            end = 0
+            while position != -1:
+                count += 1
+                end = position + len(word)
+                position = buffer.find(word, end)
+            # Keep the last len(word) - 1 characters so a match split across chunks is still found
+            carry = buffer[max(end, len(buffer) - len(word) + 1):]
+    return count
+
+
+def count_ascii(mapped, word, start, end):
+    # Bytes IGNORECASE only folds ASCII while str.upper() folds everything ("ß" becomes "SS"),
+    # so any non-ASCII byte in range returns None and the caller falls back to the str path
+    if not word.isascii():
+        return None
+    if not word:
+        return 0
+    for position in range(start, end, CHUNK_SIZE):
+        if not mapped[position:min(position + CHUNK_SIZE, end)].isascii():
+            return None
+    pattern = re.compile(re.escape(word.encode("ascii")), re.IGNORECASE)
+    return sum(1 for _ in pattern.finditer(mapped, start, end))
+
+
+def count_mmap(path, word):
+    # The OS pages the file in on demand, the regex scans the mapping without copying it
+    with open(path, "rb") as file:
+        if Path(path).stat().st_size == 0:
+            return 0
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            count = count_ascii(mapped, word, 0, len(mapped))
+    return count_stream(path, word) if count is None else count
+
+
+def tokenize(read):
+    carry = ""
+    while chunk := read():
+        buffer = carry + chunk.upper()
+        tokens = TOKEN.findall(buffer)
+        carry = ""
+        # A chunk ending inside a word leaves a partial token, finish it with the next chunk
+        if tokens and TOKEN.match(buffer, len(buffer) - 1):
+            carry = tokens.pop()
+        yield tokens
+    if carry:
+        yield [carry]
+
+
+def iter_token_chunks(path, chunk_size=CHUNK_SIZE):
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        yield from tokenize(lambda: file.read(chunk_size))
+
+
+def word_frequencies(path, chunk_size=CHUNK_SIZE):
+    counts = Counter()
+    for tokens in iter_token_chunks(path, chunk_size):
+        counts.update(tokens)
+    return counts
+
+
+def top_words(counts, k):
+    return heapq.nlargest(k, counts.items(), key=itemgetter(1))
+
+
+def whole_word_counter(text, words, top=0, chunk_size=CHUNK_SIZE):
+    counts = word_frequencies(resolve_path(text), chunk_size)
+    for word in words:
+        print(f"{word.upper()}: {counts[word.upper()]}")
+    if top:
+        print(f"Top {top} of {len(counts)} distinct words:")
+        for rank, (word, count) in enumerate(top_words(counts, top), 1):
+            print(f"{rank}. {word} {count}")
+    return counts
+
+
+def index_path(path):
+    return path.with_name(path.name + ".idx")
+
+
+def encode_positions(positions):
+    # Positions are increasing, so store the gaps as varints
+    out = bytearray()
+    previous = 0
+    for position in positions:
+        gap = position - previous
+        previous = position
+        while gap >= 0x80:
+            out.append(gap & 0x7F | 0x80)
+            gap >>= 7
+        out.append(gap)
+    return out
+
+
+def decode_positions(data):
+    positions = []
+    value = shift = previous = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        positions.append(previous)
+        value = shift = 0
+    return positions
+
+
+def build_index(path, chunk_size=CHUNK_SIZE):
+    stat = path.stat()
+    postings = defaultdict(lambda: array("Q"))
+    position = 0
+    for tokens in iter_token_chunks(path, chunk_size):
+        for token in tokens:
+            postings[token].append(position)
+            position += 1
+    terms = sorted((term.encode("utf-8"), positions) for term, positions in postings.items())
+
+    entries = bytearray()
+    blob = bytearray()
+    encoded = bytearray()
+    for term, positions in terms:
+        data = encode_positions(positions)
+        entries += INDEX_ENTRY.pack(len(blob), len(term), len(positions), len(encoded), len(data))
+        blob += term
+        encoded += data
+    terms_offset = INDEX_HEADER.size + len(entries)
+    postings_offset = terms_offset + len(blob)
+    header = INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(terms), terms_offset, postings_offset)
+
+    target = index_path(path)
+    temporary = target.with_name(target.name + ".tmp")
+    with open(temporary, "wb") as file:
+        file.write(header)
+        file.write(entries)
+        file.write(blob)
+        file.write(encoded)
+    os.replace(temporary, target)
+    return target
+
+
+def index_is_fresh(path):
+    target = index_path(path)
+    if not target.exists():
+        return False
+    with open(target, "rb") as file:
+        header = file.read(INDEX_HEADER.size)
+    if len(header) < INDEX_HEADER.size:
+        return False
+    magic, size, mtime_ns = INDEX_HEADER.unpack(header)[:3]
+    stat = path.stat()
+    return magic == INDEX_MAGIC and size == stat.st_size and mtime_ns == stat.st_mtime_ns
+
+
+def lookup(mapped, term, positions=False):
+    _, _, _, total, terms_offset, postings_offset = INDEX_HEADER.unpack_from(mapped)
+    key = term.encode("utf-8")
+    low, high = 0, total
+    # Entries are fixed size and sorted by term, so binary search straight over the mapping
+    while low < high:
+        middle = (low + high) // 2
+        offset, length, count, start, size = INDEX_ENTRY.unpack_from(mapped, INDEX_HEADER.size + middle * INDEX_ENTRY.size)
+        found = mapped[terms_offset + offset:terms_offset + offset + length]
+        if found == key:
+            # The count is stored in the entry, positions are only decoded when asked for
+            if not positions:
+                return count, None
+            return count, decode_positions(mapped[postings_offset + start:postings_offset + start + size])
+        if found < key:
+            low = middle + 1
+        else:
+            high = middle
+    return 0, [] if positions else None
+
+
+def indexed_counter(text, words, rebuild=False, show_positions=False, chunk_size=CHUNK_SIZE):
+    path = resolve_path(text)
+    if rebuild or not index_is_fresh(path):
+        print(f"Building {index_path(path)}")
+        build_index(path, chunk_size)
+    results = {}
+    with open(index_path(path), "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for word in words:
+                count, positions = lookup(mapped, word.upper(), show_positions)
+                results[word.upper()] = count, positions
+                print(f"{word.upper()}: {count}")
+                if show_positions:
+                    print(f"  positions: {positions}")
+    return results
+
+
+class CountMinSketch:
+    def __init__(self, memory_bytes, delta=0.001):
+        self.depth = max(1, math.ceil(math.log(1 / delta)))
+        self.width = max(1, memory_bytes // (8 * self.depth))
+        self.table = array("Q", [0]) * (self.width * self.depth)  # no temporary buffer, peak stays at the budget
+        self.total = 0
+
+    def _cells(self, term):
+        # Derive every row's hash from one 64-bit hash (Kirsch-Mitzenmacher)
+        value = hash(term) & 0xFFFFFFFFFFFFFFFF
+        first, second = value & 0xFFFFFFFF, value >> 32 | 1
+        return [row * self.width + (first + row * second) % self.width for row in range(self.depth)]
+
+    def add(self, term, count=1):
+        self.total += count
+        table = self.table
+        estimate = None
+        for cell in self._cells(term):
+            table[cell] += count
+            if estimate is None or table[cell] < estimate:
+                estimate = table[cell]
+        return estimate
+
+    def estimate(self, term):
+        return min(self.table[cell] for cell in self._cells(term))
+
+    def error_bound(self):
+        # Estimates overcount by at most e / width * total with probability 1 - e^-depth
+        return math.ceil(math.e / self.width * self.total)
+
+    def confidence(self):
+        return 1 - math.exp(-self.depth)
+
+
+class HeavyHitters:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.heap = []
+
+    def offer(self, term, estimate):
+        if term in self.counts or len(self.counts) < self.capacity:
+            self.counts[term] = estimate
+            heapq.heappush(self.heap, (estimate, term))
+        else:
+            # Old heap entries are left behind on update, drop them when they reach the top
+            while self.counts.get(self.heap[0][1]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            if estimate <= self.heap[0][0]:
+                return
+            del self.counts[heapq.heappop(self.heap)[1]]
+            self.counts[term] = estimate
+            heapq.heappush(self.heap, (estimate, term))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, term) for term, count in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def top(self, k):
+        return heapq.nlargest(k, self.counts.items(), key=itemgetter(1))
+
+
+def report_approximate(sketch, hitters, words, top):
+    bound = sketch.error_bound()
+    confidence = sketch.confidence() * 100
+    print(f"{sketch.total} words seen, estimates overcount by at most {bound} with {confidence:.2f}% confidence")
+    for word in words:
+        estimate = sketch.estimate(word.upper())
+        print(f"{word.upper()}: ~{estimate} (between {max(estimate - bound, 0)} and {estimate})")
+    for rank, (word, count) in enumerate(hitters.top(top), 1):
+        print(f"{rank}. {word} ~{count}")
+
+
+def approximate_counter(text, words, top=10, memory_mb=64, delta=0.001, every=0, chunk_size=CHUNK_SIZE):
+    sketch = CountMinSketch(int(memory_mb * (1 << 20)), delta)
+    # Track more candidates than reported so near-ties at the cut-off are not lost
+    hitters = HeavyHitters(max(top * 10, 100))
+    file = sys.stdin if text == "-" else open(resolve_path(text), "r", encoding="utf-8", errors="replace")
+    lines = 0
+    try:
+        # readline returns as soon as a line is complete, so a piped tail -f is processed live
+        for tokens in tokenize(lambda: file.readline(chunk_size)):
+            for term, count in Counter(tokens).items():
+                hitters.offer(term, sketch.add(term, count))
+            lines += 1
+            if every and lines % every == 0:
+                report_approximate(sketch, hitters, words, top)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if file is not sys.stdin:
+            file.close()
+    report_approximate(sketch, hitters, words, top)
+    return sketch, hitters
+
+
+def find_files(target, pattern="*.txt"):
+    path = Path(target)
+    if path.is_dir():
+        return sorted(p for p in path.rglob(pattern) if p.is_file())
+    if glob.has_magic(target):
+        return sorted(Path(p) for p in glob.glob(target, recursive=True) if Path(p).is_file())
+    return [resolve_path(target)]
+
+
+def split_lines(path, size, split_size=SPLIT_SIZE):
+    # Cut just after a newline at or past every split_size bytes, so no match spans two ranges
+    # and each range counts exactly what a single scan of the file would
+    cuts = [0]
+    with open(path, "rb") as file:
+        while cuts[-1] + split_size < size:
+            position = cuts[-1] + split_size
+            file.seek(position)
+            while chunk := file.read(CHUNK_SIZE):
+                newline = chunk.find(b"\n")
+                if newline != -1:
+                    position += newline + 1
+                    break
+                position += len(chunk)
+            if position >= size:
+                break
+            cuts.append(position)
+    return list(zip(cuts, cuts[1:] + [size]))
+
+
+def make_tasks(files, word, split_size=SPLIT_SIZE):
+    # Big files are cut into byte ranges so a few huge files still keep every worker busy
+    tasks = []
+    for path in files:
+        for start, end in split_lines(path, path.stat().st_size, split_size):
+            tasks.append((str(path), word, start, end))
+    return tasks
+
+
+def count_range(task):
+    path, word, start, end = task
+    if start >= end:
+        return path, 0
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            count = count_ascii(mapped, word, start, end)
+            if count is None:
+                # Ranges end at newlines, so decoding one never splits a character
+                count = mapped[start:end].decode("utf-8", "replace").upper().count(word.upper())
+    return path, count
+
+
+def count_files(target, word, jobs=None, split_size=SPLIT_SIZE, pattern="*.txt"):
+    files = find_files(target, pattern)
+    tasks = make_tasks(files, word, split_size)
+    counts = Counter({str(path): 0 for path in files})
+    if tasks:
+        jobs = jobs or os.cpu_count() or 1
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for path, count in executor.map(count_range, tasks, chunksize=chunksize):
+                counts[path] += count
+    for path in sorted(counts):
+        print(f"{path}: {counts[path]}")
+    total = sum(counts.values())
+    print(f"Total: {total} in {len(files)} files")
+    return counts, total
+
+
+def show_content(path, chunk_size=CHUNK_SIZE):
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        while chunk := file.read(chunk_size):
+            sys.stdout.write(chunk.upper())
+    print()
+
+
+def word_counter(text, word, chunk_size=CHUNK_SIZE, use_mmap=False, show=False):
+    path = resolve_path(text)
+    if show:
+        show_content(path, chunk_size)
+    if use_mmap:
+        count = count_mmap(path, word)
+    else:
+        count = count_stream(path, word, chunk_size)
+    print(count)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count how many times a word appears in text files.")
+    parser.add_argument("text", help="text file (the .txt extension is optional), directory, glob or - for stdin")
+    parser.add_argument("words", nargs="*")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="bytes read per chunk in streaming mode")
+    parser.add_argument("--mmap", action="store_true", help="memory-map the file instead of reading it in chunks")
+    parser.add_argument("--show", action="store_true", help="print the file content before the count")
+    parser.add_argument("--whole", action="store_true", help="count whole words in one tokenizing pass")
+    parser.add_argument("--top", type=int, default=0, metavar="K", help="also report the K most frequent words")
+    parser.add_argument("--index", action="store_true", help="answer from an on-disk index, rebuilt when the file changes")
+    parser.add_argument("--build-index", action="store_true", help="rebuild the index even if it is up to date")
+    parser.add_argument("--positions", action="store_true", help="with --index, also print word positions")
+    parser.add_argument("--approx", action="store_true", help="estimate counts in fixed memory, use - as text to read stdin")
+    parser.add_argument("--memory", type=float, default=64, help="Count-Min Sketch size in MB for --approx")
+    parser.add_argument("--delta", type=float, default=0.001, help="probability that an estimate exceeds the error bound")
+    parser.add_argument("--every", type=int, default=0, metavar="N", help="with --approx, report every N lines")
+    parser.add_argument("--jobs", type=int, help="worker processes for directory or glob mode")
+    parser.add_argument("--split-size", type=int, default=SPLIT_SIZE, help="bytes per work unit for big files")
+    parser.add_argument("--glob", default="*.txt", help="file pattern used when walking a directory")
+    args = parser.parse_args()
+    if args.approx:
+        approximate_counter(args.text, args.words, args.top or 10, args.memory, args.delta, args.every, args.chunk_size)
+        return
+    if args.index or args.build_index:
+        indexed_counter(args.text, args.words, args.build_index, args.positions, args.chunk_size)
+        return
+    if args.whole or args.top:
+        whole_word_counter(args.text, args.words, args.top, args.chunk_size)
+        return
+    if len(args.words) != 1:
+        parser.error("give exactly one word, or use --whole to count several")
+    if Path(args.text).is_dir() or glob.has_magic(args.text):
+        count_files(args.text, args.words[0], args.jobs, args.split_size, args.glob)
+        return
+    word_counter(args.text, args.words[0], args.chunk_size, args.mmap, args.show)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main()
+    else:
+        text = input("What text file: ")
+        word = input("What word: ")
+        print(Path(f"{text}.txt"))
+        word_counter(text, word)
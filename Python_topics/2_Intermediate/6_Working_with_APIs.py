@@ -100,6 +100,250 @@ if response.status_code == 200:
 else:
     print(f"Failed to fetch user data. Status code: {response.status_code}")
 
+# ----------------------------------------------------------------------
+# 6. Reusing Connections with a Session
+# ----------------------------------------------------------------------
+# Every `requests.get`/`post` call above opens a new TCP (and TLS) connection and closes it again.
+# A `requests.Session` keeps finished connections in a pool and reuses them for the next request to the same host.
+# Mounting an `HTTPAdapter` on the session sets the pool size, the retry policy and (with a small subclass) a default timeout.
+
+import random
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class JitterRetry(Retry):
+    # Exponential backoff (0.5 s, 1 s, 2 s, ...) with full jitter, so many clients do not retry in lockstep
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    # Uses a default (connect, read) timeout for every request that does not pass its own
+    def __init__(self, *args, timeout=(3.05, 10), **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def make_session(per_host=10, hosts=10, retries=3, backoff_factor=0.5, timeout=(3.05, 10)):
+    retry = JitterRetry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),  # rate limited or server errors
+        respect_retry_after_header=True,  # a 429 or 503 may say how long to wait
+        raise_on_status=False,  # after the last retry, return the response instead of raising
+    )
+    # pool_maxsize connections per host; pool_block=True makes it a hard limit, extra threads wait for a free one.
+    # Only idempotent methods are retried by default, so a POST is never sent twice.
+    adapter = TimeoutHTTPAdapter(pool_connections=hosts, pool_maxsize=per_host, pool_block=True, max_retries=retry, timeout=timeout)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Example: The same calls as above, over one pooled connection
+api = make_session()
+response = api.get("https://jsonplaceholder.typicode.com/posts/1")  # Opens a connection
+print(response.status_code)
+response = api.get("https://jsonplaceholder.typicode.com/posts/2")  # Reuses it: no new handshake
+print(response.json()["title"])
+response = api.post("https://jsonplaceholder.typicode.com/posts", json=payload)
+print(response.status_code)
+
+# ----------------------------------------------------------------------
+# 7. Measuring What Keep-Alive Saves
+# ----------------------------------------------------------------------
+# A small local stand-in for jsonplaceholder makes the comparison repeatable and offline.
+# Over the internet the saving is larger still: each new HTTPS connection costs a TCP and a TLS handshake.
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakePostsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections open between requests
+    disable_nagle_algorithm = True  # Otherwise headers and body wait on delayed ACKs, ~40 ms per reused request
+
+    def do_GET(self):
+        body = json.dumps({"userId": 1, "id": 1, "title": "Local post", "body": "Served by the stand-in."}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep the benchmark output readable
+
+
+def benchmark(url, count=500):
+    start = time.perf_counter()
+    for _ in range(count):
+        requests.get(url, timeout=5)  # New connection every time
+    fresh = (time.perf_counter() - start) / count
+    with make_session() as session:
+        start = time.perf_counter()
+        for _ in range(count):
+            session.get(url)  # Same connection every time
+        pooled = (time.perf_counter() - start) / count
+    print(f"New connection per request: {fresh * 1000:.2f} ms")
+    print(f"Pooled session: {pooled * 1000:.2f} ms ({(fresh - pooled) * 1000:.2f} ms saved per request)")
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), FakePostsHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+benchmark(f"http://127.0.0.1:{server.server_port}/posts/1")
+server.shutdown()
+
+# ----------------------------------------------------------------------
+# 8. Bulk Requests with asyncio
+# ----------------------------------------------------------------------
+# Syncing thousands of posts one request at a time spends nearly all of its time waiting on the network.
+# `requests` is blocking, so each call runs on a worker thread and asyncio only coordinates them:
+# a semaphore bounds how many are in flight, results come back as they finish,
+# and a failed request is reported without cancelling the rest of the batch.
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BulkPostsClient:
+    def __init__(self, base_url="https://jsonplaceholder.typicode.com", concurrency=20):
+        self.base_url = base_url
+        self.session = make_session(per_host=concurrency)  # One pooled connection per worker
+        self.executor = ThreadPoolExecutor(concurrency)
+        self.limit = asyncio.Semaphore(concurrency)
+
+    async def request(self, method, path, **kwargs):
+        async with self.limit:
+            call = functools.partial(self.session.request, method, self.base_url + path, **kwargs)
+            response = await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        response.raise_for_status()  # 4xx/5xx (after retries) become exceptions
+        return response.json()
+
+    async def run_many(self, calls):
+        # Yields (key, result) as each request finishes; a failed request yields its exception instead
+        async def run(key, call):
+            try:
+                return key, await call
+            except Exception as error:
+                return key, error
+
+        tasks = [asyncio.ensure_future(run(key, call)) for key, call in calls]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()  # Only matters if the caller stops early
+
+    def get_many(self, post_ids):
+        return self.run_many((post_id, self.request("GET", f"/posts/{post_id}")) for post_id in post_ids)
+
+    def create_many(self, posts):
+        return self.run_many((index, self.request("POST", "/posts", json=post)) for index, post in enumerate(posts))
+
+    def update_many(self, posts):
+        return self.run_many((post["id"], self.request("PUT", f"/posts/{post['id']}", json=post)) for post in posts)
+
+    def delete_many(self, post_ids):
+        return self.run_many((post_id, self.request("DELETE", f"/posts/{post_id}")) for post_id in post_ids)
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+
+async def collect(results):
+    # Splits a batch into successes and failures, both keyed like the input
+    done, errors = {}, {}
+    async for key, result in results:
+        if isinstance(result, Exception):
+            errors[key] = result
+        else:
+            done[key] = result
+    return done, errors
+
+
+# Example: Sync posts against a local fake of jsonplaceholder, so it runs offline
+class FakeJsonPlaceholder(FakePostsHandler):
+    posts = {}
+    lock = threading.Lock()
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+    def post_id(self):
+        try:
+            return int(self.path.rsplit("/", 1)[1])
+        except ValueError:
+            return None
+
+    def do_GET(self):
+        post = self.posts.get(self.post_id())
+        self.send_json(200 if post else 404, post or {})
+
+    def do_POST(self):
+        post = self.read_json()
+        with self.lock:
+            post["id"] = max(self.posts, default=0) + 1
+            self.posts[post["id"]] = post
+        self.send_json(201, post)
+
+    def do_PUT(self):
+        post = self.read_json()
+        with self.lock:
+            if self.post_id() not in self.posts:
+                return self.send_json(404, {})
+            post["id"] = self.post_id()
+            self.posts[post["id"]] = post
+        self.send_json(200, post)
+
+    def do_DELETE(self):
+        with self.lock:
+            found = self.posts.pop(self.post_id(), None)
+        self.send_json(200 if found else 404, {})
+
+
+async def sync_posts(base_url, count=1000):
+    client = BulkPostsClient(base_url, concurrency=20)
+    start = time.perf_counter()
+    posts = [{"title": f"Post {i}", "body": "Created in bulk.", "userId": 1} for i in range(count)]
+    created, errors = await collect(client.create_many(posts))
+    print(f"Created {len(created)} posts, {len(errors)} failed")
+    ids = [post["id"] for post in created.values()]
+    fetched, errors = await collect(client.get_many(ids + [count + 1]))  # The last id does not exist
+    print(f"Fetched {len(fetched)} posts, {len(errors)} failed: {errors}")
+    updated, errors = await collect(client.update_many({**post, "title": post["title"].upper()} for post in fetched.values()))
+    print(f"Updated {len(updated)} posts, {len(errors)} failed")
+    deleted, errors = await collect(client.delete_many(ids))
+    print(f"Deleted {len(deleted)} posts, {len(errors)} failed")
+    print(f"{4 * count} requests in {time.perf_counter() - start:.2f} s")
+    client.close()
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), FakeJsonPlaceholder)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+asyncio.run(sync_posts(f"http://127.0.0.1:{server.server_port}"))
+server.shutdown()
+
 # ----------------------------------------------------------------------
 # Summary: Best Practices for Working with APIs
 # ----------------------------------------------------------------------
@@ -136,3 +380,9 @@ except requests.exceptions.Timeout:
 headers = {"Authorization": "Bearer YOUR_ACCESS_TOKEN"}
 response = requests.get("https://api.example.com/secure-data", headers=headers)
 print(response.status_code)
+
+# 6. Reuse a Session for Repeated Calls
+# A `requests.Session` (see section 6) reuses connections, retries transient failures and applies a default timeout.
+
+# 7. Batch Large Jobs with Bounded Concurrency
+# Run many requests at once but cap how many are in flight (see section 8), and collect failures instead of stopping at the first one.
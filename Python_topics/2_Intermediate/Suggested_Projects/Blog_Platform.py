@@ -1,44 +1,445 @@
+import argparse
+import heapq
 import json
+import math
+import os
+import re
+import sqlite3
+import struct
+from collections import Counter
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
 
-with open(Path("blog_posts.json"), "r+", encoding="utf-8") as f:
-    words = json.load(f)
-    
+COMPACT_AT = 4 << 20
+TOKEN = re.compile(r"\w+")
+PRUNE_SHARE = 0.05
+PAGE_SIZE = 10
+PREVIEW = 200
+# post id, offset of its record in blog_posts.jsonl, record length (negative for a deletion)
+OFFSET = struct.Struct("<qQi")
+
+
+class PostStore:
+    # blog_posts.json is a snapshot, changes since then are appended to blog_posts.log.
+    # Only posts marked dirty are written on save, so editing one post costs one post of I/O.
+    def __init__(self, snapshot=Path("blog_posts.json"), log=Path("blog_posts.log"), compact_at=COMPACT_AT):
+        self.snapshot = snapshot
+        self.log = log
+        self.compact_at = compact_at
+        self.posts = {}
+        self.dirty = set()
+        posts = []
+        if snapshot.exists():
+            with open(snapshot, "r", encoding="utf-8") as f:
+                posts = json.load(f)
+        # Posts from an old snapshot have no id yet, number them after the known ones
+        self.next_id = max((post["id"] for post in posts if "id" in post), default=-1) + 1
+        for post in posts:
+            if "id" not in post:
+                post = {"id": self.next_id, **post}
+                self.next_id += 1
+            self.posts[post["id"]] = post
+        if log.exists():
+            good = 0
+            with open(log, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line) if line.endswith(b"\n") else None
+                    except json.JSONDecodeError:
+                        record = None
+                    if record is None:
+                        break  # a torn last line from a crash mid-write
+                    self._apply(record["id"], record["post"])
+                    good += len(line)
+            if log.stat().st_size > good:
+                # Cut the torn tail off, or the next save would be glued onto it and lost on replay
+                with open(log, "r+b") as f:
+                    f.truncate(good)
+
+    def _apply(self, post_id, post):
+        if post is None:
+            self.posts.pop(post_id, None)
+        else:
+            self.posts[post_id] = post
+        self.next_id = max(self.next_id, post_id + 1)
+
+    def __len__(self):
+        return len(self.posts)
+
+    def __iter__(self):
+        return iter(self.posts.values())
+
+    def ids_from(self, position):
+        return islice(self.posts, position, None)
+
+    def id_at(self, index):
+        if not 0 <= index < len(self.posts):
+            raise IndexError("no such post")
+        return next(self.ids_from(index))
+
+    def get(self, post_id):
+        return self.posts[post_id]
+
+    def create(self, title, content):
+        post_id = self.next_id
+        self.next_id += 1
+        self.posts[post_id] = {"id": post_id, "title": title, "content": content}
+        self.dirty.add(post_id)
+        return post_id
+
+    def update(self, post_id, field, value):
+        self.posts[post_id][field] = value
+        self.dirty.add(post_id)
+
+    def delete(self, post_id):
+        del self.posts[post_id]
+        self.dirty.add(post_id)
+
+    def save(self):
+        if not self.dirty:
+            return
+        with open(self.log, "a", encoding="utf-8") as f:
+            for post_id in sorted(self.dirty):
+                record = {"id": post_id, "post": self.posts.get(post_id)}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        self.dirty.clear()
+        if size > self.compact_at:
+            self.compact()
+
+    def compact(self):
+        # Write the full snapshot beside the old one and rename it over, readers never see half a file
+        temporary = self.snapshot.with_name(self.snapshot.name + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(list(self.posts.values()), f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.snapshot)
+        open(self.log, "w").close()
+
+
+class LazyPostStore:
+    # blog_posts.jsonl holds one {"id", "post"} record per line, newest last, and
+    # blog_posts.idx holds a fixed-size (id, offset, length) entry for each of them.
+    # Startup only reads the small index, a post is decoded when someone asks for it.
+    def __init__(self, data=Path("blog_posts.jsonl"), index=Path("blog_posts.idx")):
+        self.data_path, self.index_path = data, index
+        if not data.exists():
+            self._import(PostStore())
+        self.offsets = {}  # id -> (offset, length) of the live record, in creation order
+        self.next_id = 0
+        end = 0
+        if index.exists():
+            raw = index.read_bytes()
+            raw = raw[:len(raw) - len(raw) % OFFSET.size]
+            for post_id, offset, length in OFFSET.iter_unpack(raw):
+                self._apply(post_id, offset, length)
+                end = offset + abs(length)
+        # Every data record gets an index entry right after it, anything else means a crash in between
+        if end != data.stat().st_size:
+            self._rebuild_index()
+        self.data = open(data, "ab")
+        self.index = open(index, "ab")
+        self.reader = open(data, "rb")
+
+    def _apply(self, post_id, offset, length):
+        if length > 0:
+            self.offsets[post_id] = (offset, length)
+        else:
+            self.offsets.pop(post_id, None)
+        self.next_id = max(self.next_id, post_id + 1)
+
+    def _rebuild_index(self):
+        self.offsets, self.next_id = {}, 0
+        entries = bytearray()
+        offset = 0
+        with open(self.data_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                length = len(line) if record["post"] is not None else -len(line)
+                self._apply(record["id"], offset, length)
+                entries += OFFSET.pack(record["id"], offset, length)
+                offset += len(line)
+        with open(self.data_path, "r+b") as f:
+            f.truncate(offset)
+        self._replace(self.index_path, entries)
+
+    def _import(self, posts):
+        lines = [json.dumps({"id": post["id"], "post": post}, ensure_ascii=False).encode("utf-8") + b"\n" for post in posts]
+        self._replace(self.data_path, b"".join(lines))
+        self.index_path.unlink(missing_ok=True)
+
+    def _replace(self, path, content):
+        temporary = path.with_name(path.name + ".tmp")
+        with open(temporary, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+    def _write(self, post_id, post):
+        line = json.dumps({"id": post_id, "post": post}, ensure_ascii=False).encode("utf-8") + b"\n"
+        offset = self.data.tell()
+        self.data.write(line)
+        length = len(line) if post is not None else -len(line)
+        self.index.write(OFFSET.pack(post_id, offset, length))
+        self._apply(post_id, offset, length)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        return (self.get(post_id) for post_id in list(self.offsets))
+
+    def ids_from(self, position):
+        return islice(self.offsets, position, None)
+
+    def id_at(self, index):
+        if not 0 <= index < len(self.offsets):
+            raise IndexError("no such post")
+        return next(self.ids_from(index))
+
+    def get(self, post_id):
+        offset, length = self.offsets[post_id]
+        self.data.flush()
+        self.reader.seek(offset)
+        return json.loads(self.reader.read(length))["post"]
+
+    def create(self, title, content):
+        post_id = self.next_id
+        self._write(post_id, {"id": post_id, "title": title, "content": content})
+        return post_id
+
+    def update(self, post_id, field, value):
+        post = self.get(post_id)
+        post[field] = value
+        self._write(post_id, post)
+
+    def delete(self, post_id):
+        if post_id not in self.offsets:
+            raise KeyError(post_id)
+        self._write(post_id, None)
+
+    def save(self):
+        # Data first, so an index entry never points past the end of the data file
+        for f in (self.data, self.index):
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class SearchIndex:
+    # Inverted index term -> (post id, term frequency) kept in SQLite, so it survives restarts
+    # and every create/update/delete only touches the rows of that one post. Ranked with BM25.
+    def __init__(self, path=Path("blog_search.db"), k1=1.2, b=0.75):
+        self.k1, self.b = k1, b
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS postings (term TEXT, post_id INTEGER, tf INTEGER, PRIMARY KEY (term, post_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_post ON postings (post_id);
+            CREATE TABLE IF NOT EXISTS docs (post_id INTEGER PRIMARY KEY, length INTEGER);
+            CREATE TABLE IF NOT EXISTS stats (id INTEGER PRIMARY KEY CHECK (id = 0), docs INTEGER, length INTEGER);
+            INSERT OR IGNORE INTO stats VALUES (0, 0, 0);
+        """)
+
+    def __len__(self):
+        return self.db.execute("SELECT docs FROM stats").fetchone()[0]
+
+    def _remove(self, post_id):
+        row = self.db.execute("SELECT length FROM docs WHERE post_id = ?", (post_id,)).fetchone()
+        if row is None:
+            return
+        self.db.execute("DELETE FROM postings WHERE post_id = ?", (post_id,))
+        self.db.execute("DELETE FROM docs WHERE post_id = ?", (post_id,))
+        self.db.execute("UPDATE stats SET docs = docs - 1, length = length - ?", row)
+
+    def _add(self, post_id, post):
+        terms = Counter(TOKEN.findall(f"{post['title']} {post['content']}".lower()))
+        length = sum(terms.values())
+        self.db.executemany("INSERT INTO postings VALUES (?, ?, ?)", ((term, post_id, tf) for term, tf in terms.items()))
+        self.db.execute("INSERT INTO docs VALUES (?, ?)", (post_id, length))
+        self.db.execute("UPDATE stats SET docs = docs + 1, length = length + ?", (length,))
+
+    def put(self, post_id, post):
+        with self.db:
+            self._remove(post_id)
+            self._add(post_id, post)
+
+    def delete(self, post_id):
+        with self.db:
+            self._remove(post_id)
+
+    def rebuild(self, posts):
+        with self.db:
+            self.db.execute("DELETE FROM postings")
+            self.db.execute("DELETE FROM docs")
+            self.db.execute("UPDATE stats SET docs = 0, length = 0")
+            for post in posts:
+                self._add(post["id"], post)
+
+    def search(self, query, k=10):
+        # MaxScore: rare terms are scored first. Once the k-th best score reaches the most the
+        # remaining terms could add (idf * (k1 + 1) each), no unseen post can make the top k,
+        # so the common terms are only looked up for the posts already in the running.
+        docs, total = self.db.execute("SELECT docs, length FROM stats").fetchone()
+        terms = list(dict.fromkeys(TOKEN.findall(query.lower())))
+        if not docs or not terms:
+            return []
+        average = total / docs
+        weights = []
+        for term in terms:
+            df = self.db.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+            if df:
+                weights.append((math.log(1 + (docs - df + 0.5) / (df + 0.5)), df, term))
+        if not weights:
+            return []
+        weights.sort(reverse=True)
+        if weights[0][1] > docs * PRUNE_SHARE:
+            # Every term is in most posts, so there is nothing to skip: every posting is read and
+            # SQLite sums them faster than Python would
+            return self._sum_scores(weights, average, k)
+        remaining = [0.0] * (len(weights) + 1)
+        for i in range(len(weights) - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + weights[i][0] * (self.k1 + 1)
+        scores = {}
+        for i, (idf, _, term) in enumerate(weights):
+            threshold = heapq.nlargest(k, scores.values())[-1] if len(scores) >= k else 0.0
+            if len(scores) < k or threshold < remaining[i]:
+                rows = self.db.execute(
+                    "SELECT p.post_id, p.tf, d.length FROM postings p JOIN docs d ON d.post_id = p.post_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+            else:
+                # Posts that cannot reach the k-th best even with every remaining term drop out
+                scores = {post_id: score for post_id, score in scores.items() if score + remaining[i] > threshold}
+                candidates = list(scores)
+                rows = []
+                for start in range(0, len(candidates), 500):
+                    batch = candidates[start:start + 500]
+                    rows += self.db.execute(
+                        "SELECT p.post_id, p.tf, d.length FROM postings p JOIN docs d ON d.post_id = p.post_id "
+                        f"WHERE p.term = ? AND p.post_id IN ({', '.join('?' * len(batch))})",
+                        [term] + batch,
+                    ).fetchall()
+            for post_id, tf, length in rows:
+                score = idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average))
+                scores[post_id] = scores.get(post_id, 0.0) + score
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
+
+    def _sum_scores(self, weights, average, k):
+        # Let SQLite sum the per-term BM25 scores and keep the top k instead of ranking in Python
+        cases = " ".join("WHEN ? THEN ?" for _ in weights)
+        marks = ", ".join("?" for _ in weights)
+        rows = self.db.execute(f"""
+            SELECT p.post_id, SUM((CASE p.term {cases} END) * p.tf * (? + 1)
+                                  / (p.tf + ? * (1 - ? + ? * d.length / ?))) AS score
+            FROM postings p JOIN docs d ON d.post_id = p.post_id
+            WHERE p.term IN ({marks})
+            GROUP BY p.post_id ORDER BY score DESC LIMIT ?
+        """, [value for idf, _, term in weights for value in (term, idf)]
+            + [self.k1, self.k1, self.b, self.b, average] + [term for _, _, term in weights] + [k]).fetchall()
+        return rows
+
+
+
 def save_posts():
-    with open(Path("blog_posts.json"), "w", encoding="utf-8") as f:
-        json.dump(words, f, ensure_ascii=False, indent=4)
-            
-def view_post():
-    print("\n")
-    for index, match in enumerate(words, 1):
+    store.save()
+
+def iter_posts(start):
+    # Only ids are walked to reach `start`, posts are fetched one at a time as the page pulls them
+    for index, post_id in enumerate(store.ids_from(start), start + 1):
+        yield index, store.get(post_id)
+
+def previews(posts, limit):
+    for index, post in posts:
+        content = post["content"]
+        if limit and len(content) > limit:
+            content = content[:limit].rstrip() + "..."
+        yield index, post["title"], content
+
+def view_post(page_size=PAGE_SIZE, preview=PREVIEW):
+    cursor = 0
+    while True:
+        print("\n")
+        page = list(islice(previews(iter_posts(cursor), preview), page_size))
+        for index, title, content in page:
+            print("----------------------------------------")
+            print(f"{index}. " + title)
+            print(content)
         print("----------------------------------------")
-        print(f"{index}. " + match["title"])
-        print(match["content"])
-    print("----------------------------------------\n")
+        if page:
+            print(f"Posts {cursor + 1}-{cursor + len(page)} of {len(store)}\n")
+        else:
+            print("No posts yet\n")
+        command = input("n: next, p: previous, number: jump to post, f number: full post, q: back: ").strip()
+        if command == "n" and cursor + page_size < len(store):
+            cursor += page_size
+        elif command == "p":
+            cursor = max(cursor - page_size, 0)
+        elif command.isdigit() and 0 < int(command) <= len(store):
+            cursor = int(command) - 1
+        elif command.startswith("f ") and command[2:].isdigit() and 0 < int(command[2:]) <= len(store):
+            for index, title, content in previews(iter_posts(int(command[2:]) - 1), 0):
+                print(f"\n{index}. {title}\n{content}")
+                break
+        elif command == "q":
+            break
 
 
 def create_post():
     title = input("Title: ")
     content = input("Content: ")
-    dictionary = {"title": title, "content": content}
-    words.append(dictionary)
+    post_id = store.create(title, content)
+    search_index.put(post_id, store.get(post_id))
 
 def update_post():
     index = int(input("What post to change: ")) - 1
     try:
+        post_id = store.id_at(index)
         item = input("What to change; title or content: ")
-        dic = words[index]
         if item.__eq__("title"):
-            dic["title"] = input("Text: ")
+            store.update(post_id, "title", input("Text: "))
         else:
-            dic["content"] = input("Text: ")
+            store.update(post_id, "content", input("Text: "))
+        search_index.put(post_id, store.get(post_id))
     except:
         print("No such post")
-        
+
 def delete_post():
     index = int(input("What post to change: ")) - 1
-    del words[index]
-    
+    try:
+        post_id = store.id_at(index)
+    except IndexError:
+        print("No such post")
+        return
+    store.delete(post_id)
+    search_index.delete(post_id)
+
+def search_posts():
+    query = input("Search: ")
+    rank = 0
+    stale = False
+    for post_id, score in search_index.search(query):
+        try:
+            post = store.get(post_id)
+        except KeyError:
+            stale = True  # the index lost track of a change, skip the hit and rebuild below
+            continue
+        rank += 1
+        print(f"{rank}. {post['title']} ({score:.2f})")
+        print(post["content"][:80])
+    if not rank:
+        print("Nothing found")
+    print()
+    if stale:
+        search_index.rebuild(store)
+
 def main():
     while True:
         print("1. View ALL Posts")
@@ -46,10 +447,11 @@ def main():
         print("3. Update Post")
         print("4. Delete Post")
         print("5. Stop")
+        print("6. Search Posts")
         choice = int(input("Enter nunmber: "))
         match choice:
             case 1:
-                view_post()
+                view_post(page_size, preview)
             case 2:
                 create_post()
                 save_posts()
@@ -61,5 +463,20 @@ def main():
                 save_posts()
             case 5:
                 break
-    
-main()
+            case 6:
+                search_posts()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiny blog platform.")
+    parser.add_argument("--lazy", action="store_true", help="keep posts in blog_posts.jsonl behind an offset index, "
+                        "decoded on demand (imported from blog_posts.json on first use)")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="posts shown per page")
+    parser.add_argument("--preview", type=int, default=PREVIEW, help="characters of content shown per post, 0 for all")
+    args = parser.parse_args()
+    page_size, preview = args.page_size, args.preview
+    store = LazyPostStore() if args.lazy else PostStore()
+    # Each store keeps its own index, the two hold different posts under the same ids
+    search_index = SearchIndex(Path("blog_search_lazy.db") if args.lazy else Path("blog_search.db"))
+    if len(search_index) != len(store):
+        search_index.rebuild(store)
+    main()
@@ -1,39 +1,829 @@
-import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import argparse
+import codecs
+import json
+import mmap
+import multiprocessing
+import os
+import pickle
+import queue
+import re
+import string
+import sys
+import threading
+import time
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+CHUNK_SIZE = 1 << 20
+SPLIT_SIZE = 64 << 20
+OVERLAP = 64 << 10
+CONTEXT = 256
+INDEX_NAME = ".trigram_index.json"
+TRIGRAM = re.compile(rb"(?=(.{3}))", re.DOTALL)
+TRIGRAM_CHUNK = 64 << 10
+TIMEOUT = 30
+HEARTBEAT = 1
+SAMPLE_SIZE = 4 << 20
+BATCH = 1000
+CATEGORY_CHARS = {
+    sre_parse.CATEGORY_DIGIT: set(string.digits),
+    sre_parse.CATEGORY_WORD: set(string.ascii_letters + string.digits + "_"),
+    sre_parse.CATEGORY_SPACE: set(string.whitespace),
+}
+REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+# An ambiguous loop repeated this many times backtracks like text length ** count
+LARGE_REPEAT = 3
+PATTERNS = {
+    "email": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",
+    "telephone number": r"\b\d{10}\b",
+}
+
+GLOBAL_FLAGS = re.compile(r"(?:\(\?[aiLmsux]+\))*")
+REFERENCE = re.compile(r"\\[0-7]{3}|\\([1-9][0-9]?)|\\.|\(\?\(([0-9]+)\)|\[\^?\]?(?:\\.|[^\]\\])*\]", re.DOTALL)
+
+Hit = namedtuple("Hit", "line offset text path name", defaults=(None, None))
+
+
+def resolve_path(text):
+    path = Path(text)
+    if not path.exists() and Path(f"{text}.txt").exists():
+        path = Path(f"{text}.txt")
+    return path
+
+
+class KeywordMatch:
+    __slots__ = ("_start", "_end", "_text", "lastgroup")
+
+    def __init__(self, start, end, text, lastgroup):
+        self._start, self._end, self._text, self.lastgroup = start, end, text, lastgroup
+
+    def start(self):
+        return self._start
+
+    def end(self):
+        return self._end
+
+    def group(self):
+        return self._text
 
-def search_file(text, pattern):
+
+class AhoCorasick:
+    # Finds every keyword in one pass, with the same leftmost-longest, non-overlapping
+    # results as an alternation regex, so it can stand in for a compiled pattern.
+    def __init__(self, keywords, name="keyword"):
+        self.name = name
+        self.keywords = list(keywords)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [0]  # length of the longest keyword ending at each node
+        for keyword in keywords:
+            node = 0
+            for char in keyword:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(0)
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node] = max(self.output[node], len(keyword))
+        self.longest = max(map(len, keywords), default=0)
+        self.suffixes = [[] for _ in self.goto]  # lengths of every keyword ending at each node
+        queue = list(self.goto[0].values())
+        for node in queue:
+            if self.output[node]:
+                self.suffixes[node].append(self.output[node])
+        for node in queue:
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.suffixes[child] = ([self.output[child]] if self.output[child] else []) + self.suffixes[self.fail[child]]
+
+    def finditer(self, text, pos=0):
+        goto, fail, suffixes = self.goto, self.fail, self.suffixes
+        node = 0
+        emitted = pos  # end of the last reported match
+        candidates = []  # (start, end) not yet reported, earliest start first
+        for index in range(pos, len(text)):
+            char = text[index]
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            end = index + 1
+            for length in suffixes[node]:
+                start = end - length
+                if start >= emitted:
+                    candidates.append((start, -end))
+            if candidates:
+                # No later match can start before end - longest + 1, so earlier candidates are final
+                candidates.sort()
+                while candidates and candidates[0][0] <= end - self.longest:
+                    start, stop = candidates[0][0], -candidates[0][1]
+                    yield KeywordMatch(start, stop, text[start:stop], self.name)
+                    emitted = stop
+                    candidates = [item for item in candidates if item[0] >= emitted]
+        candidates.sort()
+        while candidates:
+            start, stop = candidates[0][0], -candidates[0][1]
+            yield KeywordMatch(start, stop, text[start:stop], self.name)
+            candidates = [item for item in candidates if item[0] >= stop]
+
+
+def shift_references(name, pattern, shift):
+    # \N and (?(N)...) must name the same groups once `shift` groups come before them.
+    # Character classes and other escapes are skipped whole, \NNN in octal is not a group.
+    def replace(match):
+        number, condition = match.group(1, 2)
+        if condition:
+            return f"(?({int(condition) + shift})"
+        if not number:
+            return match.group()
+        if int(number) + shift > 99:
+            raise re.error(f"{name}: \\{number} would be group {int(number) + shift} once combined, past \\99; use (?P<...>) and (?P=...)")
+        return f"\\{int(number) + shift}"
+
+    return REFERENCE.sub(replace, pattern)
+
+
+def build_scanner(patterns, keywords=()):
+    # One scanner for every requested pattern, match.lastgroup tells which one hit.
+    # A lone pattern is compiled as written, so its groups, references and flags mean what they say.
+    if keywords and not patterns:
+        return AhoCorasick(keywords)
+    if len(patterns) == 1 and not keywords:
+        return re.compile(patterns[0][1])
+    alternatives, hoisted, groups = [], None, 0
+    for name, pattern in patterns:
+        try:
+            count = re.compile(pattern).groups
+        except re.error as error:
+            raise re.error(f"{name}: {error}") from None
+        leading = GLOBAL_FLAGS.match(pattern).group()
+        flags = set(leading) & set("aiLmsux")
+        body = shift_references(name, pattern[len(leading):], groups + 1)
+        # i m s x can be scoped to this pattern alone, a L u apply to the whole scanner
+        scoped = "".join(sorted(flags & set("imsx")))
+        whole = "".join(sorted(flags - set("imsx")))
+        if hoisted is not None and whole != hoisted:
+            mine, theirs = (f"(?{flags})" if flags else "no global flags" for flags in (whole, hoisted))
+            raise re.error(f"{name}: {mine} differs from {theirs} in another pattern, they cannot be combined")
+        hoisted = whole
+        if scoped:
+            body = f"(?{scoped}:{body}\n)" if "x" in scoped else f"(?{scoped}:{body})"
+        alternatives.append(f"(?P<{name}>{body})")
+        groups += 1 + count
+    if keywords:
+        literals = "|".join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))
+        alternatives.append(f"(?P<keyword>{literals})")
     try:
-        with open(Path(f"{text}.txt"), "r") as file:
-            content = file.read()
-            return re.findall(pattern, content)
-    except:
-        print("Write normal name")
-        main()
+        return re.compile((f"(?{hoisted})" if hoisted else "") + "|".join(alternatives))
+    except re.error as error:
+        raise re.error(f"patterns cannot be combined: {error}") from None
 
-def display_matches(matches):
-    if matches:
-        print("Matches found:\n")
-        for index, match in enumerate(matches, 1):
-            print(f"{index}. {match}")
+
+def search_file(text, pattern, chunk_size=CHUNK_SIZE, overlap=OVERLAP, start_byte=0, end_byte=None):
+    # Scan overlapping windows so memory stays at chunk_size + overlap whatever the file size.
+    # Matches up to `overlap` characters long are found even when they cross a chunk boundary.
+    # With a byte range only matches starting before end_byte are returned, lines count from start_byte.
+    named = not isinstance(pattern, str)
+    regex = pattern if named else re.compile(pattern)
+    # Bytes that are not UTF-8 decode to lone surrogates and encode back to themselves,
+    # so byte offsets stay exact on Latin-1 and other text; only the reported text shows U+FFFD
+    decoder = codecs.getincrementaldecoder("utf-8")("surrogateescape")
+    buffer = ""
+    base = 0  # absolute character offset of buffer[0]
+    start = 0  # where the next search starts inside buffer
+    line, offset, cursor = 1, start_byte, 0  # line and byte offset of absolute character `cursor`
+    ascii_only = True
+
+    def advance(position):
+        nonlocal line, offset, cursor
+        line += buffer.count("\n", cursor - base, position - base)
+        if ascii_only:
+            offset += position - cursor
+        else:
+            offset += len(buffer[cursor - base:position - base].encode("utf-8", "surrogateescape"))
+        cursor = position
+
+    with open(resolve_path(text), "rb") as file:
+        file.seek(start_byte)
+        while True:
+            chunk = file.read(chunk_size)
+            final = not chunk
+            buffer += decoder.decode(chunk, final)
+            ascii_only = buffer.isascii()
+            # Matches starting in the last `overlap` characters wait for the next window
+            limit = len(buffer) + 1 if final else max(len(buffer) - overlap, start)
+            resume = limit
+            for match in regex.finditer(buffer, start):
+                if match.start() >= limit:
+                    break
+                advance(base + match.start())
+                if end_byte is not None and offset >= end_byte:
+                    return
+                yield Hit(line, offset, displayed(match.group()), None, match.lastgroup if named else None)
+                resume = max(match.end(), match.start() + 1)
+            if final:
+                return
+            keep = max(resume - CONTEXT, 0)
+            advance(max(base + keep, cursor))
+            if end_byte is not None and offset >= end_byte:
+                return
+            buffer = buffer[keep:]
+            base += keep
+            start = resume - keep
+
+
+def displayed(text):
+    return text if text.isascii() else text.encode("utf-8", "surrogateescape").decode("utf-8", "replace")
+
+
+def walk_files(root):
+    # os.scandir reuses the directory entry's cached type, sorting keeps the output order stable
+    with os.scandir(root) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_files(entry.path)
+        elif entry.is_file(follow_symlinks=False) and entry.name not in (INDEX_NAME, INDEX_NAME + ".tmp"):
+            yield entry.path
+
+
+def is_binary(path):
+    with open(path, "rb") as file:
+        return b"\0" in file.read(8192)
+
+
+def split_file(path, split_size=SPLIT_SIZE):
+    # Cut big files at line starts so every range begins on a character boundary.
+    # The next newline is looked for a chunk at a time, a file with no newlines is never read whole.
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, "rb") as file:
+        for guess in range(split_size, size, split_size):
+            if guess <= starts[-1]:
+                continue
+            file.seek(guess)
+            position = guess
+            while chunk := file.read(CHUNK_SIZE):
+                newline = chunk.find(b"\n")
+                if newline != -1:
+                    position += newline + 1
+                    break
+                position += len(chunk)
+            if position >= size:
+                break
+            starts.append(position)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def count_lines(path, start_byte, end_byte, chunk_size=CHUNK_SIZE):
+    lines = 0
+    with open(path, "rb") as file:
+        file.seek(start_byte)
+        remaining = end_byte - start_byte
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            lines += chunk.count(b"\n")
+            remaining -= len(chunk)
+    return lines
+
+
+def search_range(task):
+    path, pattern, start_byte, end_byte, overlap, use_bytes, followed = task
+    if use_bytes:
+        hits = search_bytes(path, pattern, overlap, start_byte, end_byte)
+    else:
+        hits = search_file(path, pattern, CHUNK_SIZE, overlap, start_byte, end_byte)
+    # Line counts only shift the ranges after this one, so the last range of a file skips the second read
+    lines = count_lines(path, start_byte, end_byte) if followed else 0
+    return [hit._replace(path=path) for hit in hits], lines
+
+
+def search_tree(root, pattern, jobs=None, split_size=SPLIT_SIZE, overlap=OVERLAP, use_bytes=False, paths=None):
+    if paths is None:
+        paths = (path for path in walk_files(root) if not is_binary(path))
+    tasks = []
+    for path in paths:
+        ranges = split_file(path, split_size)
+        for number, (start_byte, end_byte) in enumerate(ranges, 1):
+            tasks.append((path, pattern, start_byte, end_byte, overlap, use_bytes, number < len(ranges)))
+    if not tasks:
+        return
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = max(1, min(64, len(tasks) // (jobs * 4)))
+    previous, lines_before = None, 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # map keeps task order, so results come out sorted by file and then by offset
+        for (path, *_), (hits, lines) in zip(tasks, executor.map(search_range, tasks, chunksize=chunksize)):
+            if path != previous:
+                previous, lines_before = path, 0
+            for hit in hits:
+                yield hit._replace(line=hit.line + lines_before)
+            lines_before += lines
+
+
+def bytes_scanner(pattern):
+    # Recompile as a bytes pattern, \b \d \w then match ASCII only like the built-in patterns expect
+    if isinstance(pattern, str):
+        return re.compile(pattern.encode("utf-8"))
+    if isinstance(pattern, AhoCorasick):
+        literals = b"|".join(re.escape(keyword.encode("utf-8")) for keyword in sorted(pattern.keywords, key=len, reverse=True))
+        return re.compile(b"(?P<" + pattern.name.encode() + b">" + literals + b")")
+    return re.compile(pattern.pattern.encode("utf-8"), pattern.flags & ~re.UNICODE)
+
+
+def count_newlines(mapped, start, end):
+    lines = 0
+    for position in range(start, end, CHUNK_SIZE):
+        lines += mapped[position:min(position + CHUNK_SIZE, end)].count(b"\n")
+    return lines
+
+
+def search_bytes(text, pattern, overlap=OVERLAP, start_byte=0, end_byte=None):
+    # Match straight over the mapped file, only the matched spans are ever decoded
+    named = not isinstance(pattern, str)
+    regex = bytes_scanner(pattern)
+    path = resolve_path(text)
+    if path.stat().st_size == 0:
+        return
+    with open(path, "rb") as file:
+        # Left open on purpose: the finditer scanner holds a view of the map, it closes when released
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    stop = len(mapped) if end_byte is None else min(end_byte + overlap, len(mapped))
+    line, cursor = 1, start_byte
+    for match in regex.finditer(mapped, start_byte, stop):
+        if end_byte is not None and match.start() >= end_byte:
+            break
+        line += count_newlines(mapped, cursor, match.start())
+        cursor = match.start()
+        yield Hit(line, match.start(), match.group().decode("utf-8", "replace"), None, match.lastgroup if named else None)
+
+
+def literal_query(data):
+    # None means "no constraint", a bytes value is one trigram, tuples combine queries
+    return all_of([data[i:i + 3] for i in range(len(data) - 2)])
+
+
+def all_of(queries):
+    queries = [query for query in dict.fromkeys(queries) if query is not None]
+    if not queries:
+        return None
+    return queries[0] if len(queries) == 1 else ("and", tuple(queries))
+
+
+def any_of(queries):
+    if not queries or None in queries:
+        return None
+    return queries[0] if len(queries) == 1 else ("or", tuple(queries))
+
+
+def sequence_query(items):
+    queries, run = [], []
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        if op is sre_parse.SUBPATTERN and all(item[0] is sre_parse.LITERAL for item in av[-1]) and not av[1]:
+            run.extend(chr(item[1]) for item in av[-1])
+            continue
+        queries.append(literal_query("".join(run).encode("utf-8")))
+        run = []
+        if op is sre_parse.SUBPATTERN:
+            if not av[1] & sre_parse.SRE_FLAG_IGNORECASE:
+                queries.append(sequence_query(av[-1]))
+        elif op is sre_parse.BRANCH:
+            queries.append(any_of([sequence_query(branch) for branch in av[1]]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            queries.append(sequence_query(av[2]))
+    queries.append(literal_query("".join(run).encode("utf-8")))
+    return all_of(queries)
+
+
+def required_trigrams(pattern):
+    # Literal text every match must contain, as in codesearch: trigrams that are ANDed along
+    # a sequence and ORed across alternatives. Anything unsure falls back to "every file".
+    if isinstance(pattern, AhoCorasick):
+        return any_of([literal_query(keyword.encode("utf-8")) for keyword in pattern.keywords])
+    source, flags = (pattern, 0) if isinstance(pattern, str) else (pattern.pattern, pattern.flags)
+    if isinstance(source, bytes):
+        source = source.decode("latin-1")
+    parsed = sre_parse.parse(source, flags & ~re.UNICODE)
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+    return sequence_query(parsed)
+
+
+def file_trigrams(path):
+    # Small chunks keep findall's list short; the last two bytes carry over so no trigram is lost
+    trigrams = set()
+    carry = b""
+    with open(path, "rb") as file:
+        while chunk := file.read(TRIGRAM_CHUNK):
+            buffer = carry + chunk
+            trigrams.update(TRIGRAM.findall(buffer))
+            carry = buffer[-2:]
+    return {trigram.decode("latin-1") for trigram in trigrams}
+
+
+def update_index(root):
+    # files maps a relative path to [id, mtime_ns, size], id -1 marks a skipped binary file
+    index_file = Path(root) / INDEX_NAME
+    if index_file.exists():
+        with open(index_file, "r", encoding="utf-8") as f:
+            index = json.load(f)
     else:
+        index = {"next_id": 0, "files": {}, "postings": {}}
+    files, postings = index["files"], index["postings"]
+    current = {}
+    for path in walk_files(root):
+        stat = os.stat(path)
+        current[os.path.relpath(path, root)] = [stat.st_mtime_ns, stat.st_size]
+    changed = [rel for rel in current if rel not in files or files[rel][1:] != current[rel]]
+    removed = [rel for rel in files if rel not in current]
+    if not changed and not removed:
+        return index
+    stale = {files.pop(rel)[0] for rel in removed + changed if rel in files}
+    if stale:
+        for trigram in list(postings):
+            postings[trigram] = [file_id for file_id in postings[trigram] if file_id not in stale]
+            if not postings[trigram]:
+                del postings[trigram]
+    for rel in changed:
+        path = os.path.join(root, rel)
+        if is_binary(path):
+            files[rel] = [-1] + current[rel]
+            continue
+        file_id = index["next_id"]
+        index["next_id"] += 1
+        files[rel] = [file_id] + current[rel]
+        for trigram in file_trigrams(path):
+            postings.setdefault(trigram, []).append(file_id)
+    temporary = index_file.with_name(INDEX_NAME + ".tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(temporary, index_file)
+    return index
+
+
+def evaluate(query, index, every_id):
+    if query is None:
+        return every_id
+    if isinstance(query, bytes):
+        return set(index["postings"].get(query.decode("latin-1"), ()))
+    kind, parts = query
+    results = [evaluate(part, index, every_id) for part in parts]
+    return set.intersection(*results) if kind == "and" else set.union(*results)
+
+
+def search_indexed(root, pattern, jobs=None, split_size=SPLIT_SIZE, overlap=OVERLAP, use_bytes=False):
+    index = update_index(root)
+    paths = {entry[0]: rel for rel, entry in index["files"].items() if entry[0] >= 0}
+    candidates = evaluate(required_trigrams(pattern), index, set(paths))
+    # Same order as walk_files, which sorts names at every directory level
+    selected = sorted((paths[file_id] for file_id in candidates), key=lambda rel: rel.split(os.sep))
+    print(f"Trigram index: scanning {len(selected)} of {len(paths)} files", file=sys.stderr)
+    return search_tree(root, pattern, jobs, split_size, overlap, use_bytes, [os.path.join(root, rel) for rel in selected])
+
+
+def char_set(op, av):
+    # Characters an element can start with, None when it could be (almost) anything
+    if op is sre_parse.LITERAL:
+        return {chr(av)}
+    if op is sre_parse.IN:
+        chars = set()
+        for item_op, item_av in av:
+            if item_op is sre_parse.LITERAL:
+                chars.add(chr(item_av))
+            elif item_op is sre_parse.RANGE and item_av[1] - item_av[0] < 512:
+                chars.update(map(chr, range(item_av[0], item_av[1] + 1)))
+            elif item_op is sre_parse.CATEGORY and item_av in CATEGORY_CHARS:
+                chars |= CATEGORY_CHARS[item_av]
+            else:
+                return None
+        return chars
+    if op is sre_parse.SUBPATTERN:
+        return first_chars(av[-1])
+    if op in REPEATS:
+        return first_chars(av[2])
+    if op is sre_parse.BRANCH:
+        branches = [first_chars(branch) for branch in av[1]]
+        return None if None in branches else set().union(*branches)
+    return None
+
+
+def first_chars(items):
+    # An item that can match nothing, like a* or (|b), lets the next one start the match too;
+    # when every item can, the first character comes from whatever follows, so it could be anything
+    chars = set()
+    for op, av in items:
+        if op is sre_parse.AT:
+            continue
+        item = char_set(op, av)
+        if item is None:
+            return None
+        chars |= item
+        if not can_be_empty([(op, av)]):
+            return chars
+    return None
+
+
+def can_be_empty(items):
+    for op, av in items:
+        if op in REPEATS:
+            empty = av[0] == 0 or can_be_empty(av[2])
+        elif op is sre_parse.SUBPATTERN:
+            empty = can_be_empty(av[-1])
+        elif op is sre_parse.BRANCH:
+            empty = any(can_be_empty(branch) for branch in av[1])
+        else:
+            empty = op is sre_parse.AT
+        if not empty:
+            return False
+    return True
+
+
+def overlaps(first, second):
+    return first is None or second is None or bool(first & second)
+
+
+def flatten(items):
+    for op, av in items:
+        if op is sre_parse.SUBPATTERN:
+            yield from flatten(av[-1])
+        else:
+            yield op, av
+
+
+def ambiguous_body(body):
+    # (a+)+ and (\w+\s?)* are exponential because one run of text can be split between
+    # iterations in many ways. A required separator the inner loop cannot eat, like the
+    # dot in ([a-z]+\.)*, pins every split down and keeps matching linear.
+    inner, required = [], []
+    for op, av in flatten(body):
+        if op in REPEATS and av[1] is sre_parse.MAXREPEAT:
+            inner.append(first_chars(av[2]))
+        elif op in REPEATS and av[0] == 0 or op is sre_parse.AT:
+            continue
+        else:
+            required.append(char_set(op, av))
+    if not inner:
+        return False
+    loop_chars = None if None in inner else set().union(*inner)
+    return all(overlaps(chars, loop_chars) for chars in required)
+
+
+def check_items(items, repeated, warnings):
+    previous = False  # start characters of the previous unbounded quantifier, False if there is none
+    for op, av in items:
+        if op in REPEATS:
+            low, high, body = av
+            unbounded = high is sre_parse.MAXREPEAT
+            looping = unbounded or high >= LARGE_REPEAT
+            if looping and ambiguous_body(body):
+                if unbounded:
+                    warnings.append("nested quantifier like (a+)+: backtracking can grow exponentially")
+                else:
+                    warnings.append(f"nested quantifier repeated up to {high} times like (.*a){{12}}: backtracking can grow like length ** {high}")
+            if unbounded:
+                chars = first_chars(body)
+                if previous is not False and overlaps(previous, chars):
+                    warnings.append("adjacent quantifiers like \\d+\\d+ can split the same text many ways: polynomial backtracking")
+                previous = chars
+            elif low:
+                previous = False
+            check_items(body, repeated or looping, warnings)
+            continue
+        previous = False
+        if op is sre_parse.SUBPATTERN:
+            check_items(av[-1], repeated, warnings)
+        elif op is sre_parse.BRANCH:
+            starts = [first_chars(branch) for branch in av[1]]
+            if repeated and any(overlaps(a, b) for i, a in enumerate(starts) for b in starts[i + 1:]):
+                warnings.append("quantified alternation like (a|b|ab)* whose branches can match the same text")
+            for branch in av[1]:
+                check_items(branch, repeated, warnings)
+        elif op is sre_parse.GROUPREF:
+            warnings.append("backreference: matching is not guaranteed to be linear")
+
+
+def analyze_pattern(pattern):
+    # Flag constructs that make the backtracking engine super-linear before anything runs
+    source, flags = (pattern, 0) if isinstance(pattern, str) else (pattern.pattern, pattern.flags)
+    if isinstance(pattern, AhoCorasick):
+        return []
+    warnings = []
+    check_items(sre_parse.parse(source, flags & ~re.UNICODE), False, warnings)
+    return list(dict.fromkeys(warnings))
+
+
+def search_worker(channel, text, pattern, chunk_size, overlap, use_bytes):
+    # The re module holds the GIL while it matches, so this heartbeat goes quiet exactly when
+    # a match is stuck, however long a healthy search of a big file takes
+    def heartbeat():
+        while True:
+            time.sleep(HEARTBEAT)
+            channel.put(("alive", None))
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        hits = search_bytes(text, pattern, overlap) if use_bytes else search_file(text, pattern, chunk_size, overlap)
+        batch, sent = [], time.monotonic()
+        for hit in hits:
+            batch.append(hit)
+            # Batch hits to keep queue overhead low, but never hold the first results back for long
+            if len(batch) >= BATCH or time.monotonic() - sent > 0.05:
+                channel.put(("hits", batch))
+                batch, sent = [], time.monotonic()
+        channel.put(("hits", batch))
+        channel.put(("done", None))
+    except Exception as error:
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(repr(error))
+        channel.put(("error", error))
+
+
+def benchmark_worker(channel, pattern, sample):
+    regex = pattern if not isinstance(pattern, str) else re.compile(pattern)
+    rounds, start = 0, time.perf_counter()
+    while True:
+        for _ in regex.finditer(sample):
+            pass
+        rounds += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= 0.2:
+            break
+    channel.put(("done", len(sample.encode("utf-8")) * rounds / elapsed / (1 << 20)))
+
+
+def run_guarded(target, args, timeout):
+    # A runaway regex cannot be interrupted inside the re module, so it runs in a process we can kill.
+    # The timeout is how long the worker may go without sending anything, time spent by the caller
+    # on the results does not count.
+    context = multiprocessing.get_context()
+    channel = context.Queue()
+    worker = context.Process(target=target, args=(channel,) + args, daemon=True)
+    worker.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"made no progress for {timeout} seconds")
+            try:
+                kind, value = channel.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if kind == "error":
+                raise value
+            yield kind, value
+            if kind == "done":
+                return
+            deadline = time.monotonic() + timeout
+    finally:
+        if worker.is_alive():
+            worker.kill()
+        worker.join()
+
+
+def guarded_search(text, pattern, timeout=TIMEOUT, chunk_size=CHUNK_SIZE, overlap=OVERLAP, use_bytes=False):
+    arguments = (str(resolve_path(text)), pattern, chunk_size, overlap, use_bytes)
+    for kind, value in run_guarded(search_worker, arguments, timeout):
+        if kind == "hits":
+            yield from value
+
+
+def benchmark(text, patterns, timeout=TIMEOUT, sample_size=SAMPLE_SIZE):
+    with open(resolve_path(text), "rb") as file:
+        sample = file.read(sample_size).decode("utf-8", "replace")
+    print(f"Benchmark on the first {len(sample.encode('utf-8')) / (1 << 20):.2f} MB of {text}")
+    for name, pattern in patterns:
+        try:
+            for _, speed in run_guarded(benchmark_worker, (pattern, sample), timeout):
+                print(f"{name}: {speed:.1f} MB/s")
+        except TimeoutError:
+            print(f"{name}: slower than one pass per {timeout} seconds")
+
+
+def warn_about(patterns):
+    for name, pattern in patterns:
+        for warning in analyze_pattern(pattern):
+            print(f"warning: {name}: {warning}", file=sys.stderr)
+
+
+def display_matches(matches):
+    found = False
+    for index, match in enumerate(matches, 1):
+        if not found:
+            print("Matches found:\n")
+            found = True
+        where = f"{match.path}:" if match.path else ""
+        name = f" [{match.name}]" if match.name else ""
+        print(f"{index}. {where}line {match.line}, byte {match.offset}{name}: {match.text}")
+    if not found:
         print("No matches found.")
-    
+
+
 def main():
     text = input("Name: ")
+    if not resolve_path(text).is_file():
+        print("Write normal name")
+        return main()
     print("1. email\n")
     print("2. telephone number\n")
-    print("3. custom")    
+    print("3. custom")
     choice = input("What to choose: ")
 
-    if choice == "email":
-        pattern = r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b"
-    elif choice == "telephone number":
-        pattern = r"\b\d{10}\b"
+    if choice in PATTERNS:
+        pattern = PATTERNS[choice]
     elif choice == "custom":
         pattern = input("Enter your custom regex pattern: ").strip()
+        warn_about([("custom", pattern)])
     else:
         print("Invalid. kys")
+        return
+
+    try:
+        display_matches(guarded_search(text, pattern))
+    except TimeoutError as error:
+        print(f"Search {error}, the pattern is too slow for this file")
 
-    display_matches(search_file(text, pattern))
-    
-main()
+
+def cli():
+    parser = argparse.ArgumentParser(description="Search text files with a regular expression.")
+    parser.add_argument("text", help="text file (the .txt extension is optional) or a directory to search recursively")
+    parser.add_argument("--email", action="store_true")
+    parser.add_argument("--telephone", action="store_true")
+    parser.add_argument("--pattern", action="append", default=[], help="custom regex, can be repeated")
+    parser.add_argument("--keyword", action="append", default=[], help="literal keyword, can be repeated")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="bytes read per chunk")
+    parser.add_argument("--overlap", type=int, default=OVERLAP, help="characters shared by neighbouring windows")
+    parser.add_argument("--bytes", action="store_true", help="match bytes over an mmap of the file, for ASCII patterns")
+    parser.add_argument("--index", action="store_true", help=f"in directory mode, prefilter files with a trigram index kept in {INDEX_NAME}")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="seconds a single-file search may go without progress before it is stopped, 0 for no limit")
+    parser.add_argument("--benchmark", action="store_true", help="report each pattern's MB/s on a sample of the file and exit")
+    parser.add_argument("--jobs", type=int, help="worker processes for directory mode")
+    parser.add_argument("--split-size", type=int, default=SPLIT_SIZE, help="bytes per work unit for big files in directory mode")
+    args = parser.parse_args()
+    if not resolve_path(args.text).exists():
+        parser.error(f"{args.text}: no such file or directory")
+    patterns = []
+    if args.email:
+        patterns.append(("email", PATTERNS["email"]))
+    if args.telephone:
+        patterns.append(("telephone", PATTERNS["telephone number"]))
+    for number, custom in enumerate(args.pattern, 1):
+        patterns.append((f"custom{number}", custom))
+    if not patterns and not args.keyword:
+        parser.error("choose at least one of --email, --telephone, --pattern or --keyword")
+    try:
+        pattern = build_scanner(patterns, args.keyword)
+    except re.error as error:
+        parser.error(f"bad pattern: {error}")
+    if args.bytes:
+        # Matching UTF-8 bytes is only right for ASCII patterns, keywords are matched as exact byte strings
+        if not all(source.isascii() for _, source in patterns):
+            parser.error("--bytes needs ASCII patterns, search without it to match non-ASCII text")
+        try:
+            bytes_scanner(pattern)
+        except re.error as error:
+            parser.error(f"pattern cannot be used with --bytes: {error}")
+    warn_about(patterns)
+    if args.benchmark:
+        if args.keyword:
+            patterns.append(("keyword", build_scanner([], args.keyword)))
+        if len(patterns) > 1:
+            patterns.append(("combined", pattern))
+        benchmark(args.text, patterns, args.timeout or TIMEOUT)
+    elif os.path.isdir(args.text) and args.index:
+        display_matches(search_indexed(args.text, pattern, args.jobs, args.split_size, args.overlap, args.bytes))
+    elif os.path.isdir(args.text):
+        display_matches(search_tree(args.text, pattern, args.jobs, args.split_size, args.overlap, args.bytes))
+    elif args.timeout:
+        try:
+            display_matches(guarded_search(args.text, pattern, args.timeout, args.chunk_size, args.overlap, args.bytes))
+        except TimeoutError as error:
+            print(f"Search {error}, the pattern is too slow for this file")
+    elif args.bytes:
+        display_matches(search_bytes(args.text, pattern, args.overlap))
+    else:
+        display_matches(search_file(args.text, pattern, args.chunk_size, args.overlap))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        cli()
+    else:
+        main()
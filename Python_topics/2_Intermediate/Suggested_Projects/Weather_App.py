@@ -1,21 +1,473 @@
-import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlsplit
+import argparse
+import asyncio
 import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import warnings
+
+import requests
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+HOURLY = ("temperature_2m",)
+STAND_IN_PORT = 8765
+COMPACT_SEGMENTS = 64
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CITIES = {
+    "BEIJING": (39.9075, 116.3972),
+    "ASTANA": (51.3648, 67.2679),
+    "ANKARA": (39.9199, 32.8543),
+    "SAN MATEO": (37.563, -122.3255),
+}
+
+
+def forecast_url(latitude, longitude, base_url=FORECAST_URL, variables=HOURLY):
+    query = urlencode({"latitude": latitude, "longitude": longitude, "hourly": ",".join(variables)}, safe=",")
+    return f"{base_url}?{query}"
+
+
+def parse_location(text):
+    # A known city name or "latitude,longitude"
+    name = text.strip().upper()
+    if name in CITIES:
+        return name, *CITIES[name]
+    latitude, _, longitude = text.partition(",")
+    try:
+        return text.strip(), float(latitude), float(longitude)
+    except ValueError:
+        raise ValueError(f"{text!r} is neither a known city nor latitude,longitude") from None
+
+
+class ForecastCache:
+    # Forecasts are kept in SQLite keyed by (endpoint, latitude, longitude, variables) and in a
+    # dict once read. Younger than ttl is a hit and skips the network; younger than ttl + stale
+    # is still answered at once while the caller refreshes it in the background.
+    def __init__(self, path=Path("forecast_cache.db"), ttl=3600, stale=86400):
+        self.ttl = ttl
+        self.stale = stale
+        self.memory = {}
+        self.hits = self.stale_hits = self.misses = 0
+        self.lookup_time = 0.0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS forecasts (url TEXT, latitude REAL, longitude REAL, variables TEXT, "
+                "fetched REAL, body TEXT, PRIMARY KEY (url, latitude, longitude, variables))"
+            )
+
+    def key(self, url, latitude, longitude, variables):
+        return url, round(latitude, 4), round(longitude, 4), ",".join(sorted(variables))
+
+    def get(self, url, latitude, longitude, variables=HOURLY):
+        # (forecast, "fresh"), (forecast, "stale") or (None, None)
+        start = time.perf_counter()
+        key = self.key(url, latitude, longitude, variables)
+        if key not in self.memory:
+            with self.lock:
+                row = self.db.execute(
+                    "SELECT fetched, body FROM forecasts WHERE url = ? AND latitude = ? AND longitude = ? AND variables = ?", key
+                ).fetchone()
+            if row:
+                self.memory[key] = row[0], json.loads(row[1])
+        fetched, forecast = self.memory.get(key, (0.0, None))
+        age = time.time() - fetched
+        if forecast is not None and age < self.ttl:
+            self.hits += 1
+            state = "fresh"
+        elif forecast is not None and age < self.ttl + self.stale:
+            self.stale_hits += 1
+            state = "stale"
+        else:
+            self.misses += 1
+            forecast = state = None
+        self.lookup_time += time.perf_counter() - start
+        return forecast, state
+
+    def put(self, url, latitude, longitude, forecast, variables=HOURLY):
+        key = self.key(url, latitude, longitude, variables)
+        fetched = time.time()
+        self.memory[key] = fetched, forecast
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?)", key + (fetched, json.dumps(forecast)))
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale": self.stale_hits,
+            "misses": self.misses,
+            "lookup_us": self.lookup_time / lookups * 1e6 if lookups else 0.0,
+        }
+
+
+def columns(forecast, variables=HOURLY):
+    # Only the requested hourly fields become arrays, indexed by their timestamps
+    hourly = forecast["hourly"]
+    times = np.array(hourly["time"], dtype="datetime64[m]")
+    return times, {variable: np.array([np.nan if v is None else v for v in hourly[variable]], dtype=float) for variable in variables}
+
+
+def summary(values):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # every hour missing
+        return {"min": float(np.nanmin(values)), "max": float(np.nanmax(values)), "mean": float(np.nanmean(values))}
+
+
+def rolling(values, window, statistic="mean"):
+    # One value per full window of `window` hours; missing hours are skipped
+    if len(values) < window:
+        return np.empty(0)
+    if statistic == "mean":
+        # Differences of cumulative sums give every window's total in O(n), whatever the window
+        sums = np.concatenate(([0.0], np.cumsum(np.nan_to_num(values))))
+        counts = np.concatenate(([0], np.cumsum(~np.isnan(values))))
+        with np.errstate(all="ignore"):
+            return (sums[window:] - sums[:-window]) / (counts[window:] - counts[:-window])
+    windows = np.lib.stride_tricks.sliding_window_view(values, window)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # every hour missing
+        return {"min": np.nanmin, "max": np.nanmax}[statistic](windows, axis=1)
+
+
+class ForecastHistory:
+    # Every download of a place is appended as one segment in forecast_history/<latitude>_<longitude>/:
+    # a .npy of timestamps and one .npy per variable. Old segments are never rewritten until
+    # COMPACT_SEGMENTS pile up, and reading memory-maps them, so long histories skip JSON entirely.
+    def __init__(self, root=Path("forecast_history")):
+        self.root = root
+
+    def folder(self, latitude, longitude):
+        return self.root / f"{latitude:.4f}_{longitude:.4f}"
+
+    def segments(self, folder):
+        # The timestamps file is written last, so a segment without one is unfinished
+        return sorted(int(path.name.split(".")[0]) for path in folder.glob("*.time.npy"))
+
+    def append(self, latitude, longitude, forecast, variables=HOURLY):
+        times, values = columns(forecast, variables)
+        folder = self.folder(latitude, longitude)
+        self.write(folder, time.time_ns(), times, values)
+        if len(self.segments(folder)) > COMPACT_SEGMENTS:
+            self.compact(folder)
+
+    def write(self, folder, segment, times, values):
+        folder.mkdir(parents=True, exist_ok=True)
+        for name, array in (*values.items(), ("time", times)):
+            temporary = folder / f"{segment}.{name}.tmp.npy"
+            np.save(temporary, array)
+            os.replace(temporary, folder / f"{segment}.{name}.npy")
+
+    def load(self, latitude, longitude, variable="temperature_2m", days=None):
+        # Where downloads overlap the newest one wins, so every hour holds its latest forecast
+        folder = self.folder(latitude, longitude)
+        parts = []
+        for segment in self.segments(folder):
+            if (folder / f"{segment}.{variable}.npy").exists():
+                times = np.load(folder / f"{segment}.time.npy", mmap_mode="r")
+                parts.append((times, np.load(folder / f"{segment}.{variable}.npy", mmap_mode="r")))
+        if not parts:
+            return np.empty(0, dtype="datetime64[m]"), np.empty(0)
+        if days is not None:
+            # Segments are sorted by time, so only the pages inside the window are read
+            since = max(times[-1] for times, _ in parts if len(times)) - np.timedelta64(int(days * 24 * 60), "m")
+            parts = [(times[start:], values[start:]) for times, values in parts for start in [np.searchsorted(times, since, "right")]]
+        times = np.concatenate([times for times, _ in reversed(parts)])
+        values = np.concatenate([values for _, values in reversed(parts)])
+        times, first = np.unique(times, return_index=True)
+        return times, values[first]
+
+    def compact(self, folder):
+        segments = self.segments(folder)
+        variables = {path.name.split(".")[1] for path in folder.glob(f"{segments[-1]}.*.npy")} - {"time"}
+        merged = {}
+        for variable in variables:
+            parts = [
+                (np.load(folder / f"{segment}.time.npy"), np.load(folder / f"{segment}.{variable}.npy"))
+                for segment in reversed(segments)
+                if (folder / f"{segment}.{variable}.npy").exists()
+            ]
+            times, first = np.unique(np.concatenate([times for times, _ in parts]), return_index=True)
+            merged[variable] = times, np.concatenate([values for _, values in parts])[first]
+        times = merged[min(merged)][0]
+        if any(len(other) != len(times) or (other != times).any() for other, _ in merged.values()):
+            return  # variables were downloaded over different hours, keep the segments as they are
+        self.write(folder, segments[-1] + 1, times, {variable: values for variable, (_, values) in merged.items()})
+        for segment in segments:
+            for path in folder.glob(f"{segment}.*.npy"):
+                path.unlink()
+
 
-city = input("What city, choices are Beijing, Astana, Ankara, San Mateo: ").upper()
-match city:
-    case "BEIJING":
-        latitude, longitude = 39.9075, 116.3972
-    case "ASTANA":
-        latitude, longitude = 51.3648, 67.2679
-    case "ANKARA":
-        latitude, longitude = 39.9199, 32.8543
-    case "SAN MATEO":
-        latitude, longitude = 37.563, -122.3255
-
-response = requests.get(f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&hourly=temperature_2m") 
-
-if response.status_code == 200:
-    data = response.json() 
+async def read_response(reader):
+    version, status = (await reader.readuntil(b"\r\n")).split()[:2]
+    headers = {}
+    while (line := await reader.readuntil(b"\r\n")) != b"\r\n":
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    keep_alive = version == b"HTTP/1.1" and headers.get("connection", "").lower() != "close"
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = bytearray()
+        while size := int((await reader.readuntil(b"\r\n")).split(b";")[0], 16):
+            body += (await reader.readexactly(size + 2))[:-2]
+        while await reader.readuntil(b"\r\n") != b"\r\n":
+            pass  # trailers
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return int(status), keep_alive, bytes(body)
+
+
+class ConnectionPool:
+    # Idle HTTP/1.1 connections are kept per host, so a bulk run pays for the TCP and TLS
+    # handshakes once per connection instead of once per city. At most `limit` are open per host.
+    def __init__(self, limit=10):
+        self.limit = limit
+        self.idle = {}
+        self.slots = {}
+
+    async def get(self, url):
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        origin = (parts.hostname, parts.port or (443 if secure else 80), secure)
+        target = f"{parts.path or '/'}?{parts.query}" if parts.query else parts.path or "/"
+        request = f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nAccept: application/json\r\n\r\n".encode()
+        idle = self.idle.setdefault(origin, [])
+        async with self.slots.setdefault(origin, asyncio.Semaphore(self.limit)):
+            while True:
+                reused = bool(idle)
+                if reused:
+                    reader, writer = idle.pop()
+                else:
+                    reader, writer = await asyncio.open_connection(origin[0], origin[1], ssl=secure or None)
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    status, keep_alive, body = await read_response(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        continue  # the server dropped the idle connection, open a fresh one
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if keep_alive:
+                    idle.append((reader, writer))
+                else:
+                    writer.close()
+                return status, body
+
+    def close(self):
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle.clear()
+
+
+async def fetch_forecast(pool, url, timeout=10, retries=3, backoff=0.5):
+    for attempt in range(retries + 1):
+        try:
+            status, body = await asyncio.wait_for(pool.get(url), timeout)
+        except (OSError, EOFError, asyncio.TimeoutError) as error:
+            failure = error
+        else:
+            if status == 200:
+                return json.loads(body)
+            failure = RuntimeError(f"Failed to fetch data. Status code: {status}")
+            if status not in RETRY_STATUSES:
+                raise failure
+        if attempt < retries:
+            # Exponential backoff with full jitter, so failed cities do not all retry at once
+            await asyncio.sleep(random.uniform(0, backoff * 2 ** attempt))
+    raise failure
+
+
+async def fetch_many(locations, base_url=FORECAST_URL, concurrency=20, timeout=10, retries=3, cache=None, history=None):
+    # Yields (name, forecast or exception) as each location finishes, not in input order
+    pool = ConnectionPool(concurrency)
+    gate = asyncio.Semaphore(concurrency)
+    refreshes = set()
+
+    async def download(latitude, longitude):
+        async with gate:
+            forecast = await fetch_forecast(pool, forecast_url(latitude, longitude, base_url), timeout, retries)
+        if cache is not None:
+            cache.put(base_url, latitude, longitude, forecast)
+        if history is not None:
+            history.append(latitude, longitude, forecast)
+        return forecast
+
+    async def fetch(name, latitude, longitude):
+        if cache is not None:
+            forecast, state = cache.get(base_url, latitude, longitude)
+            if state == "stale":
+                refreshes.add(asyncio.ensure_future(download(latitude, longitude)))
+            if forecast is not None:
+                return name, forecast
+        try:
+            return name, await download(latitude, longitude)
+        except Exception as error:
+            return name, error
+
+    tasks = [asyncio.ensure_future(fetch(*location)) for location in locations]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+        await asyncio.gather(*refreshes, return_exceptions=True)
+    finally:
+        for task in tasks + list(refreshes):
+            task.cancel()
+        pool.close()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Answers like open-meteo with a canned 48 hour forecast, over keep-alive HTTP/1.1
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out separately, don't wait on delayed ACKs
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        try:
+            latitude = float(query["latitude"][0])
+            longitude = float(query["longitude"][0])
+        except (KeyError, ValueError):
+            self.send_error(400)
+            return
+        hours = range(48)
+        hourly = {"time": [f"2024-01-{1 + hour // 24:02d}T{hour % 24:02d}:00" for hour in hours]}
+        for variable in query.get("hourly", ["temperature_2m"])[0].split(","):
+            hourly[variable] = [round(25 - abs(latitude) / 3 + 5 * ((hour % 24) - 12) / 12, 1) for hour in hours]
+        body = json.dumps({"latitude": latitude, "longitude": longitude, "hourly": hourly}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def stand_in_server(port=STAND_IN_PORT):
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1/forecast"
+
+
+async def bulk(locations, base_url, concurrency, timeout, retries, cache, history):
+    failed = 0
+    async for name, result in fetch_many(locations, base_url, concurrency, timeout, retries, cache, history):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"{name}: {result!r}")
+        else:
+            print(f"{name}: {result['hourly']['temperature_2m'][0]}")
+    return failed
+
+
+def trend(history, locations, days, window):
+    for name, latitude, longitude in locations:
+        times, values = history.load(latitude, longitude, days=days)
+        if not len(times):
+            print(f"{name}: no history")
+            continue
+        stats = summary(values)
+        smoothed = rolling(values, window)
+        latest = f", {window} h mean {smoothed[-1]:.1f}" if len(smoothed) else ""
+        print(f"{name}: {times[0]} to {times[-1]}, min {stats['min']:.1f}, max {stats['max']:.1f}, mean {stats['mean']:.1f}{latest}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch the current temperature for many places at once.")
+    parser.add_argument("locations", nargs="*", metavar="CITY", help="a known city or latitude,longitude")
+    parser.add_argument("--file", help="read one city or latitude,longitude per line")
+    parser.add_argument("--concurrency", type=int, default=20, help="requests in flight at once")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds per request attempt")
+    parser.add_argument("--retries", type=int, default=3, help="retries on timeouts, 429 and 5xx")
+    parser.add_argument("--url", default=FORECAST_URL, help="forecast endpoint")
+    parser.add_argument("--cache", default="forecast_cache.db", metavar="PATH", help="forecast cache database")
+    parser.add_argument("--no-cache", action="store_true", help="always download")
+    parser.add_argument("--ttl", type=float, default=3600, help="seconds a cached forecast is fresh")
+    parser.add_argument("--stale", type=float, default=86400, help="seconds past the ttl a forecast is served while refreshing")
+    parser.add_argument("--history", nargs="?", const="forecast_history", metavar="DIR", help="keep every downloaded forecast as .npy segments")
+    parser.add_argument("--trend", type=float, metavar="DAYS", help="summarise the last DAYS of --history instead of fetching")
+    parser.add_argument("--window", type=int, default=24, help="hours in the --trend rolling mean")
+    parser.add_argument("--stand-in", action="store_true", help="serve canned forecasts locally instead of calling open-meteo")
+    args = parser.parse_args()
+    texts = list(args.locations)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            texts += [line for line in f if line.strip()]
+    if not texts:
+        parser.error("give at least one city or latitude,longitude")
+    try:
+        locations = [parse_location(text) for text in texts]
+    except ValueError as error:
+        parser.error(str(error))
+    if (args.history or args.trend) and np is None:
+        parser.error("--history and --trend need NumPy: pip install numpy")
+    history = ForecastHistory(Path(args.history or "forecast_history")) if args.history or args.trend else None
+    if args.trend:
+        trend(history, locations, args.trend, args.window)
+        return
+    base_url = args.url
+    if args.stand_in:
+        server, base_url = stand_in_server()
+    cache = None if args.no_cache else ForecastCache(Path(args.cache), args.ttl, args.stale)
+    start = time.perf_counter()
+    failed = asyncio.run(bulk(locations, base_url, args.concurrency, args.timeout, args.retries, cache, history))
+    print(f"{len(locations) - failed}/{len(locations)} fetched in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"cache: {stats['hits']} hits, {stats['stale']} stale, {stats['misses']} misses, {stats['lookup_us']:.0f} us per lookup", file=sys.stderr)
+    if args.stand_in:
+        server.shutdown()
+
+
+def revalidate(cache, latitude, longitude):
+    response = requests.get(forecast_url(latitude, longitude), timeout=10)
+    if response.status_code == 200:
+        cache.put(FORECAST_URL, latitude, longitude, response.json())
+
+
+def weather_app():
+    city = input("What city, choices are Beijing, Astana, Ankara, San Mateo: ").upper()
+    if city not in CITIES:
+        print(f"Unknown city {city}")
+        return
+    latitude, longitude = CITIES[city]
+
+    cache = ForecastCache()
+    data, state = cache.get(FORECAST_URL, latitude, longitude)
+    if state == "stale":
+        threading.Thread(target=revalidate, args=(cache, latitude, longitude)).start()
+    if data is None:
+        response = requests.get(forecast_url(latitude, longitude), timeout=10)
+        if response.status_code != 200:
+            print(f"Failed to fetch data. Status code: {response.status_code}")
+            return
+        data = response.json()
+        cache.put(FORECAST_URL, latitude, longitude, data)
     print(data["hourly"]["temperature_2m"][0])
-else:
-    print(f"Failed to fetch data. Status code: {response.status_code}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main()
+    else:
+        weather_app()